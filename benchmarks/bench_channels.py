@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compares receiving and parsing a LSTC reply line by line (one "_recvmsg"
+# and one "Channel()" call per line, as done before) with the bulk path of
+# "list_channels". The reply is recorded from the fake VDR once and then
+# replayed from memory, so only the client side is measured.
+#
+#   python3 benchmarks/bench_channels.py --channels 6000
+
+import argparse
+import socket
+import time
+from pysvdrp import SVDRPConnection
+from pysvdrp.channels import Channel, Channels, _parse_channels
+from pysvdrp.fakevdr import FakeVDR
+
+# Stands in for the socket of a connection and returns recorded data
+class ReplaySocket:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def recv(self, size):
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def settimeout(self, timeout):
+        pass
+
+# Returns the raw LSTC reply of "vdr"
+def record(vdr):
+    with socket.create_connection((vdr.host, vdr.port)) as sock:
+        fp = sock.makefile("rb")
+        fp.readline() # Greeting
+        sock.sendall(b"LSTC :groups\n")
+        data = []
+        while True:
+            line = fp.readline()
+            data.append(line)
+            if line[3:4] == b" ":
+                return b"".join(data)
+
+# The previous implementation: every line is received and parsed on its own
+def linewise(conn):
+    status, message = conn._recvmsg()
+    data = [message]
+    while status < 0:
+        status, message = conn._recvmsg()
+        data.append(message)
+    result = Channels()
+    groupid = 0
+    for line in data:
+        number, channelstring = line.split(" ", 1)
+        channel = Channel(channelstring, number)
+        if channel.groupsep:
+            groupid += 1
+            channel.groupnumber = groupid
+        result.append(channel)
+    return result
+
+def bulk(conn):
+    status, data = conn._recvlist()
+    return _parse_channels(data)
+
+# Replays "reply" "repeat" times. Returns the last result and the best time.
+def replay(conn, reply, function, repeat):
+    best = None
+    for run in range(repeat):
+        conn.socket = ReplaySocket(reply)
+        conn._pending = 1
+        start = time.perf_counter()
+        result = function(conn)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description="LSTC parsing benchmark")
+    parser.add_argument("--channels", type=int, default=6000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with FakeVDR(channels=args.channels, events=0) as vdr:
+        reply = record(vdr)
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        sock = conn.socket
+        expected, oldtime = replay(conn, reply, linewise, args.repeat)
+        result, newtime = replay(conn, reply, bulk, args.repeat)
+        conn.socket = sock
+
+    if [(channel.number, str(channel)) for channel in result] != \
+       [(channel.number, str(channel)) for channel in expected]:
+        raise SystemExit("Results differ!")
+
+    print("{} channels, {} KiB".format(len(result), len(reply) // 1024))
+    print("line by line: {:8.2f} ms {:6.2f} us/channel".format(oldtime * 1000, oldtime / len(result) * 1e6))
+    print("bulk:         {:8.2f} ms {:6.2f} us/channel".format(newtime * 1000, newtime / len(result) * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Measures the startup cost of short-lived scripts: "import pysvdrp" (with
+# "-X importtime") and a one-shot script which sends a single command to a
+# fake VDR. Fails if "import pysvdrp" loads modules which should only be
+# loaded on first use or if it takes longer than "--max-ms".
+#
+#   python3 benchmarks/bench_import.py [--repeat 5] [--max-ms 50]
+
+import argparse
+import subprocess
+import sys
+import time
+from pysvdrp.fakevdr import FakeVDR
+
+# Modules "import pysvdrp" must not load
+LAZY_MODULES = ("cchardet", "pysvdrp.channels", "pysvdrp.epg", "pysvdrp.plugins",
+                "pysvdrp.tools", "pysvdrp.metrics", "concurrent.futures", "inspect")
+
+ONESHOT = "import pysvdrp; pysvdrp.SVDRPConnection({!r}, {}).list_plugins()"
+
+# Returns the cumulative import time of "pysvdrp" in microseconds
+def importtime():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import pysvdrp"],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "pysvdrp":
+            return int(fields[1])
+    raise RuntimeError("No import time reported for pysvdrp")
+
+def loadedmodules():
+    code = "import sys, pysvdrp; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    return set(result.stdout.split())
+
+def main():
+    parser = argparse.ArgumentParser(description="pysvdrp import time benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if importing takes longer (best of all runs)")
+    args = parser.parse_args()
+
+    # The first run may have to compile the modules
+    importtime()
+    best = min(importtime() for run in range(args.repeat)) / 1000
+    print("import pysvdrp: {:.1f} ms".format(best))
+
+    with FakeVDR(channels=10, events=10) as vdr:
+        command = [sys.executable, "-c", ONESHOT.format(vdr.host, vdr.port)]
+        runs = []
+        for run in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run(command, check=True)
+            runs.append(time.perf_counter() - start)
+    print("one-shot script (interpreter start, import, PLUG): {:.1f} ms".format(min(runs) * 1000))
+
+    failed = False
+    loaded = sorted(loadedmodules().intersection(LAZY_MODULES))
+    if loaded:
+        print("Loaded by import pysvdrp, but should be lazy: " + ", ".join(loaded))
+        failed = True
+    if args.max_ms is not None and best > args.max_ms:
+        print("Import time exceeds {:.1f} ms".format(args.max_ms))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
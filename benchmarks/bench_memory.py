@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Measures the memory used by a parsed full guide EPG dump and by a parsed
+# channel list.
+#
+#   python3 benchmarks/bench_memory.py [events] [channels]
+
+import sys
+import tracemalloc
+from pysvdrp.epg import Schedules
+from pysvdrp.channels import _parse_channels
+from pysvdrp.fakevdr import synthetic_channels, synthetic_epg
+
+def measure(function, *args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def parse_epg(lines):
+    schedules = Schedules()
+    schedules.read(iter(lines))
+    return schedules
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+    channellines = ["{} {}".format(number + 1, line) for number, line in enumerate(synthetic_channels(channels))]
+    channelids = ["S19.2E-1-1-{}".format(number) for number in range(channels)]
+
+    lines = synthetic_epg(channelids, events)
+    schedules, used = measure(parse_epg, lines)
+    print("{} events: {:.1f} MB, {:.0f} bytes/event".format(events, used / 1e6, used / events))
+    del schedules
+
+    result, used = measure(_parse_channels, channellines)
+    print("{} channels: {:.1f} MB, {:.0f} bytes/channel".format(channels, used / 1e6, used / channels))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Benchmarks the hot paths of pysvdrp against the in-process fake VDR.
+# Reports throughput, latency per command and peak memory.
+#
+#   python3 benchmarks/benchmark.py --channels 3000 --events 200000
+
+import argparse
+import time
+import tracemalloc
+from pysvdrp import SVDRPConnection
+from pysvdrp.fakevdr import FakeVDR
+
+# Runs "function" "repeat" times. Returns the result of the last run and the
+# best time.
+def timed(repeat, function, *args):
+    best = None
+    for run in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+# Returns the result of "function" and the peak memory it allocated
+def peakmemory(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+def report(name, seconds, count = None, unit = None):
+    line = "{:<28} {:>10.2f} ms".format(name, seconds * 1000)
+    if count is not None:
+        line += "  {:>12.0f} {}/sec".format(count / seconds, unit)
+    print(line)
+
+def stream_epg(conn):
+    events = 0
+    for channelid, schedule in conn.iter_epg():
+        events += len(schedule)
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels", type=int, default=3000)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0, help="reply delay in seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second")
+    parser.add_argument("--badcharset", type=int, default=0, help="every n-th LSTE line in ISO-8859-1")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeVDR(channels=args.channels, events=args.events, latency=args.latency,
+                 bandwidth=args.bandwidth, badcharset=args.badcharset) as vdr:
+        conn, seconds = timed(1, SVDRPConnection, vdr.host, vdr.port)
+        report("connect", seconds)
+
+        # Raw receive path
+        def recvlist():
+            conn._send("LSTE")
+            return conn._recvlist()[1]
+        lines, seconds = timed(args.repeat, recvlist)
+        report("LSTE _recvlist", seconds, len(lines), "lines")
+
+        # Parsing
+        channels, seconds = timed(args.repeat, conn.list_channels)
+        report("LSTC list_channels", seconds, len(channels), "channels")
+        schedules, seconds = timed(args.repeat, conn.list_epg)
+        events = sum(len(schedule) for schedule in schedules.values())
+        report("LSTE list_epg", seconds, events, "events")
+
+        # Upload
+        result, seconds = timed(1, conn.put_epg, schedules)
+        report("PUTE put_epg", seconds, events, "events")
+
+        # Latency of small commands
+        channelid = channels[len(channels) // 2].channelid
+        result, seconds = timed(args.repeat, conn.get_channel, channelid)
+        report("LSTC <id> get_channel", seconds)
+        result, seconds = timed(args.repeat, conn.list_plugins)
+        report("PLUG list_plugins", seconds)
+        result, seconds = timed(1, conn.move_channel, 1, 2)
+        report("MOVC move_channel", seconds)
+        result, seconds = timed(1, conn.clear_epg, channelid)
+        report("CLRE <id> clear_epg", seconds)
+
+        # Peak memory
+        del lines, schedules
+        result, peak = peakmemory(conn.list_epg)
+        print("{:<28} {:>10.1f} MB".format("list_epg peak memory", peak / 1e6))
+        del result
+        result, peak = peakmemory(stream_epg, conn)
+        print("{:<28} {:>10.1f} MB".format("iter_epg peak memory", peak / 1e6))
+        del conn
+
+if __name__ == "__main__":
+    main()
@@ -14,126 +14,529 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import select
 import socket
 import time
-import cchardet
+from collections import deque
 import pysvdrp.exceptions as ex
 
-# This is the socket timeout we set initially
+# Default time (seconds) one socket operation may take
 DEFAULT_TIMEOUT = 20
 
+# Number of bytes we try to receive from VDR at once
+RECV_BUFSIZE = 65536
+
+# Number of lines that are joined and written at once by "_sendlines"
+SEND_BATCHLINES = 1024
+
+# Reply codes that are raised as exceptions. Any other 5xx code raises
+# a generic "SVDRPException".
+_ERRORS = {
+    451: ex.ActionAborted,
+    500: ex.CommandUnrecognized,
+    501: ex.ParameterError,
+    502: ex.CommandNotImplemented,
+    504: ex.ParameterNotImplemented,
+    550: ex.ActionNotTaken,
+    554: ex.TransactionFailed
+}
+
+# Command method which is imported from its module on first use. Keeps
+# "import pysvdrp" fast for scripts which only send a few commands. After
+# the first access the function replaces the descriptor in the class.
+class _Command:
+    def __init__(self, module: str):
+        self.module = module
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        function = getattr(__import__(self.module, fromlist=(self.name,)), self.name)
+        setattr(owner, self.name, function)
+        return function.__get__(instance, owner)
+
+
 class SVDRPConnection:
-    from pysvdrp.channels import list_channels, get_channel, move_channel, delete_channel
-    from pysvdrp.plugins import list_plugins
-    from pysvdrp.tools import set_channel_position
-    from pysvdrp.epg import list_epg, clear_epg, put_epg
+    list_channels = _Command("pysvdrp.channels")
+    get_channel = _Command("pysvdrp.channels")
+    move_channel = _Command("pysvdrp.channels")
+    delete_channel = _Command("pysvdrp.channels")
+    new_channel = _Command("pysvdrp.channels")
+    modify_channel = _Command("pysvdrp.channels")
+    list_plugins = _Command("pysvdrp.plugins")
+    set_channel_position = _Command("pysvdrp.tools")
+    apply_channel_order = _Command("pysvdrp.tools")
+    sync_channels = _Command("pysvdrp.tools")
+    list_epg = _Command("pysvdrp.epg")
+    iter_epg = _Command("pysvdrp.epg")
+    fetch_epg_parallel = _Command("pysvdrp.epg")
+    clear_epg = _Command("pysvdrp.epg")
+    put_epg = _Command("pysvdrp.epg")
+    list_epg_columns = _Command("pysvdrp.columnar")
+    batch = _Command("pysvdrp.batch")
 
-    def __init__(self, host: str = "127.0.0.1", port: int = 6419) -> None:
+    def __init__(self, host: str = "127.0.0.1", port: int = 6419, timeout: float = DEFAULT_TIMEOUT) -> None:
         """
-        Establishes a SVDRP connection
+        Establishes a SVDRP connection. If VDR closes the connection (for
+        example after "SVDRPTimeout" seconds of inactivity) or a command is
+        aborted, then the next command reconnects.
 
         host: VDR host to connect to (default: 127.0.0.1)
         port: SVDRP port to use (default: 6419)
+        timeout: Seconds one socket operation may take. Use "deadline" to
+                 limit the time of whole commands.
         """
-        # Connect to VDR
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((host, port))
-
-        # Set timeout to prevent "blocking forever" situations
-        self.socket.settimeout(DEFAULT_TIMEOUT)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
 
-        # Open a reading binary file handler.
-        self._readfh = self.socket.makefile(mode="rb")
-
-        # Read VDR's status welcome message
-        self.encoding = "ascii"
-        status, message = self._recvmsg()
-        if status != 220:
-            raise ex.SVDRException(message, status)
+        # Callables which get a "CommandMetrics" object after every command.
+        # See "pysvdrp.metrics".
+        self.observers = []
+        self._metrics = None
 
-        # VDR returns 3 strings, each one separated with "; "
-        hostinfo, hosttime, self.encoding = message.split("; ")
+        # Optional "ChannelCache" to answer channel list requests from. See
+        # "pysvdrp.channelcache".
+        self.channelcache = None
 
-        # Parse hostinfo
-        self.hostname, dummy, dummy, self.vdrversion = hostinfo.split(" ")
-        major, minor, revision = self.vdrversion.split(".")
-        self.vdrversnum = int(major) * 10000 + int(minor) * 100 + int(revision)
+        # Absolute time (time.monotonic) the running command has to be done
+        # by. Set by "deadline".
+        self._deadline = None
 
-        # Parse hosttime
-        self.vdrtime = self._asctime2time(hosttime)
+        # Encodings detected for lines VDR sent with bad encoding. The key is
+        # the channel id of the EPG data the line belonged to (or None), as
+        # every channel may come from a different source.
+        self._fallbackencodings = {}
 
-        # Open a writing file handler
-        self._writefh = self.socket.makefile(mode="w", encoding=self.encoding)
+        self.socket = None
+        self._pending = 0
+        self._connect()
 
     # Properly disconnect from VDR to prevent "lost connection" log messages
     def __del__(self):
+        self.close()
+
+    def close(self):
+        """
+        Disconnects from VDR. The connection can still be used, the next
+        command reconnects.
+        """
+        if self.socket is None:
+            return
+
         # Give VDR 5 seconds to handle the "QUIT" command
         self.socket.settimeout(5)
 
-        # Try to send "QUIT" now
+        # Try to send "QUIT" now. Only possible if no reply is pending.
         # We don't care about errors happening here
-        try:
-            self._send("QUIT")
-        except:
-            pass
+        if not self._pending:
+            try:
+                self._writefh.write("QUIT\n")
+                self._writefh.flush()
+            except:
+                pass
 
         # Then properly close socket
-        self.socket.close()
+        self._disconnect()
+
+    def deadline(self, seconds: float):
+        """
+        Returns a context manager which limits the time of all commands sent
+        in it. The limit covers connecting and the whole reply, also of
+        commands with many reply lines. If it is exceeded, then
+        "TimeoutError" is raised and the connection is dropped, so no
+        partial reply is left over. The next command reconnects.
+
+          with conn.deadline(2.0):
+              schedules = conn.list_epg(filter="now")
+
+        Nested deadlines can't extend the outer one.
+
+        seconds: Time limit in seconds. None for no limit.
+        """
+        return _Deadline(self, seconds)
+
+    def cancel(self):
+        """
+        Aborts the running command. May be called from other threads. The
+        aborted command raises "ConnectionAbortedError" and the connection
+        is dropped. The next command reconnects.
+        """
+        self._cancelled = True
+        sock = self.socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # Connects to VDR and reads the welcome message. Fails fast: There are
+    # no retries and the time is limited by the timeout and the deadline.
+    def _connect(self):
+        timeout = self._timeout()
+        self.socket = socket.create_connection((self.host, self.port), timeout)
+
+        # Receive buffers. "_rbuf" holds an incomplete line, "_lines" already
+        # decoded lines that have not been processed, yet.
+        self._rbuf = b""
+        self._lines = deque()
+
+        # Number of replies VDR still has to send. Replies that were not read
+        # completely (aborted commands) make us reconnect before the next
+        # command.
+        self._pending = 1
+        self._cancelled = False
+
+        # Channel id (as bytes) of the last received LSTE "C" line
+        self._channel = None
+
+        # Read VDR's status welcome message. On reconnects it is not counted
+        # as reply of the running command.
+        self.encoding = "ascii"
+        metrics = self._metrics
+        self._metrics = None
+        try:
+            self._parsegreeting(*self._recvmsg())
+        except BaseException:
+            self._disconnect()
+            raise
+        finally:
+            self._metrics = metrics
+
+        # Set timeout to prevent "blocking forever" situations
+        self.socket.settimeout(self.timeout)
+
+        # Open a writing file handler
+        self._writefh = self.socket.makefile(mode="w", encoding=self.encoding)
+
+    # Closes the socket without saying goodbye to VDR
+    def _disconnect(self):
+        sock = self.socket
+        if sock is None:
+            return
+        self.socket = None
+        self._pending = 0
+        self._lines.clear()
+        self._rbuf = b""
+        writefh = getattr(self, "_writefh", None)
+        if writefh is not None:
+            self._writefh = None
+            try:
+                writefh.close()
+            except OSError:
+                pass
+        sock.close()
+
+    # Returns the timeout for the next socket operation. Raises
+    # "TimeoutError" if the deadline is exceeded.
+    def _timeout(self):
+        if self._deadline is None:
+            return self.timeout
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            if self._pending:
+                self._disconnect()
+            raise TimeoutError("SVDRP deadline exceeded")
+        return min(remaining, self.timeout)
+
+    # Makes sure the connection is usable for the next command. Reconnects if
+    # it was dropped, if a reply is left over or if VDR sent something
+    # without being asked (its "closing connection" message after an idle
+    # timeout).
+    def _prepare(self):
+        if self.socket is not None and not self._pending and not self._lines:
+            if not select.select((self.socket,), (), (), 0)[0]:
+                if self._deadline is not None:
+                    self.socket.settimeout(self._timeout())
+                return
+        self._disconnect()
+        self._connect()
 
     # Converts the time format sent by VDR to seconds since epoch
     def _asctime2time(self, asctime: str) -> int:
         #Sun Dec 27 17:15:23 2020
         return time.mktime(time.strptime(asctime, "%a %b %d %H:%M:%S %Y"))
 
+    # Parses VDR's status welcome message
+    def _parsegreeting(self, status, message):
+        if status != 220:
+            raise ex.SVDRPException(message, status)
+
+        # VDR returns 3 strings, each one separated with "; "
+        hostinfo, hosttime, self.encoding = message.split("; ")
+
+        # Parse hostinfo
+        self.hostname, dummy, dummy, self.vdrversion = hostinfo.split(" ")
+        major, minor, revision = self.vdrversion.split(".")
+        self.vdrversnum = int(major) * 10000 + int(minor) * 100 + int(revision)
+
+        # Parse hosttime
+        self.vdrtime = self._asctime2time(hosttime)
+
     # Receives a one-line message from VDR
     def _recvmsg(self):
-        line = self._readfh.readline()
+        lines = self._lines
+        while not lines:
+            self._feed(self._recvdata())
+        if self._metrics is not None:
+            self._metrics.received()
+        line = lines.popleft()
+        if line[3:4] != "-":
+            self._pending -= 1
+        return self._parsemsg(line)
+
+    # Receives the next chunk of data from VDR. On errors the connection is
+    # dropped, as the rest of the reply can't be read any more.
+    def _recvdata(self):
+        if self._deadline is not None:
+            self.socket.settimeout(self._timeout())
+        try:
+            data = self.socket.recv(RECV_BUFSIZE)
+        except socket.timeout:
+            self._disconnect()
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                raise TimeoutError("SVDRP deadline exceeded") from None
+            raise TimeoutError("Timed out waiting for VDR") from None
+        except OSError:
+            self._disconnect()
+            raise
+        if not data:
+            cancelled = self._cancelled
+            self._disconnect()
+            if cancelled:
+                raise ConnectionAbortedError("SVDRP command cancelled")
+            raise ConnectionError("Connection closed by VDR")
+        if self._metrics is not None:
+            self._metrics.bytes += len(data)
+        return data
+
+    # Splits received data into lines. All complete lines are decoded at once.
+    def _feed(self, data: bytes):
+        if self._rbuf:
+            data = self._rbuf + data
+        end = data.rfind(b"\r\n")
+        if end == -1:
+            self._rbuf = data
+            return
+        self._rbuf = data[end + 2:]
+        chunk = data[:end]
 
         # Try to decode with the encoding, used by VDR, first. If this fails
-        # (bad DVB data) then try to detect the correct encoding.
+        # (bad DVB data) then only the failing lines are handled separately.
         try:
-            line = line.decode(self.encoding)
-        except Exception as err:
-            line = line.decode(cchardet.detect(line).get('encoding', 'ascii'), errors="surrogateescape")
-
-        line = line.rstrip("\r\n")
-        status = line[:3]
-        cont = line[3:4]
-        message = line[4:]
-
-        status = int(status)
-        if status == 451:
-            raise ex.ActionAborted(message, status)
-        elif status == 500:
-            raise ex.CommandUnrecognized(message, status)
-        elif status == 501:
-            raise ex.ParameterError(message, status)
-        elif status == 502:
-            raise ex.CommandNotImplemented(message, status)
-        elif status == 504:
-            raise ex.ParameterNotImplemented(message, status)
-        elif status == 550:
-            raise ex.ActionNotTaken(message, status)
-        elif status == 554:
-            raise ex.TransactionFailed(message, status)
-        elif 500 <= status < 600 :
-            raise ex.SVDRPException(message, status)
+            self._lines.extend(chunk.decode(self.encoding).split("\r\n"))
+        except UnicodeDecodeError:
+            self._lines.extend(map(self._decode, chunk.split(b"\r\n")))
+        else:
+            self._trackchannel(chunk)
 
-        if cont == "-":
-            status *= -1
+    # Remembers the channel of the last LSTE "C" line in a chunk of lines
+    # which was decoded without "_decode"
+    def _trackchannel(self, chunk: bytes):
+        start = chunk.rfind(b"215-C ")
+        if chunk.rfind(b"215-c", start + 1) != -1:
+            self._channel = None
+        elif start == 0 or start > 0 and chunk[start - 1] == 10:
+            self._channel = chunk[start + 6:].split(b" ", 1)[0]
 
-        return status, message
+    # Decodes one line. If the encoding, used by VDR, fails, then the encoding
+    # is detected. The detected encoding is tried first for further bad lines
+    # of the same channel.
+    def _decode(self, line: bytes):
+        if line[4:5] in (b"C", b"c") and line[:4] == b"215-":
+            self._channel = line[6:].split(b" ", 1)[0] if line[4:5] == b"C" else None
+
+        try:
+            return line.decode(self.encoding)
+        except UnicodeDecodeError:
+            pass
+
+        if self._metrics is not None:
+            self._metrics.fallbacks += 1
+
+        encoding = self._fallbackencodings.get(self._channel)
+        if encoding:
+            try:
+                return line.decode(encoding)
+            except UnicodeDecodeError:
+                pass
+
+        # Only imported when needed as it takes a while to load
+        import cchardet
+        encoding = cchardet.detect(line).get('encoding') or 'ascii'
+        self._fallbackencodings[self._channel] = encoding
+        return line.decode(encoding, errors="surrogateescape")
+
+    # Parses one decoded message line received from VDR. Error replies are
+    # raised as exceptions.
+    def _parsemsg(self, line: str):
+        status = int(line[:3])
+        if status >= 451:
+            if status in _ERRORS:
+                raise _ERRORS[status](line[4:], status)
+            elif 500 <= status < 600:
+                raise ex.SVDRPException(line[4:], status)
+
+        if line[3:4] == "-":
+            return -status, line[4:]
+
+        return status, line[4:]
 
     # Receives a list from VDR
     def _recvlist(self):
+        # Lines already split off by "_recvmsg" are handled one by one
+        if self._lines:
+            status, message = self._recvmsg()
+            data = [message]
+            while status < 0:
+                status, message = self._recvmsg()
+                data.append(message)
+            return status, data
+
+        # Otherwise the raw reply is collected until its final line (status
+        # code followed by a space) arrived. Then it is decoded and split at
+        # once instead of handling each line separately.
+        data = bytearray(self._rbuf)
+        self._rbuf = b""
+        metrics = self._metrics
+        firstreply = False
+        marker = None
+        search = 0
+        while True:
+            if marker is None:
+                end = data.find(b"\r\n")
+                if end != -1:
+                    if data[3:4] != b"-":
+                        break
+                    marker = b"\r\n" + bytes(data[:3]) + b" "
+                    search = end
+            if marker is not None:
+                end = data.find(marker, search)
+                if end != -1:
+                    search = end
+                    end = data.find(b"\r\n", end + len(marker))
+                    if end != -1:
+                        break
+                else:
+                    search = max(len(data) - len(marker) + 1, 0)
+            data += self._recvdata()
+            if metrics is not None and not firstreply:
+                metrics.received()
+                firstreply = True
+        self._rbuf = bytes(data[end + 2:])
+        del data[end:]
+        self._pending -= 1
+
+        try:
+            lines = data.decode(self.encoding).split("\r\n")
+        except UnicodeDecodeError:
+            lines = list(map(self._decode, bytes(data).split(b"\r\n")))
+        if metrics is not None:
+            metrics.received()
+            metrics.lines += len(lines) - 1 - firstreply
+
+        # Raises error replies
+        status, message = self._parsemsg(lines[-1])
+        return status, [line[4:] for line in lines]
+
+    # Receives a list from VDR line by line. Only the continuation lines are
+    # yielded, the final line is returned as (status, message) tuple.
+    # Stops early if another command reconnected in between as the rest of
+    # the reply is gone then.
+    def _recviter(self):
+        sock = self.socket
+        lines = self._lines
         status, message = self._recvmsg()
-        data = [message]
-        while status < 0:
+        if status >= 0:
+            return status, message
+        marker = "{}-".format(-status)
+        while True:
+            yield message
+            if self.socket is not sock:
+                return None
+
+            # Continuation lines which were received already are passed on
+            # without "_recvmsg" if they don't have to be measured
+            if self._metrics is None:
+                while lines:
+                    line = lines.popleft()
+                    if line[:4] != marker:
+                        lines.appendleft(line)
+                        break
+                    yield line[4:]
+                    if self.socket is not sock:
+                        return None
+
             status, message = self._recvmsg()
-            data.append(message)
-        return status, data
+            if status >= 0:
+                return status, message
 
     # Sends a command to VDR
     def _send(self, command: str):
-        self._writefh.write(command + "\n")
-        self._writefh.flush()
+        self._prepare()
+        if self._metrics is not None:
+            self._metrics.sent()
+        self._pending += 1
+        try:
+            self._writefh.write(command + "\n")
+            self._writefh.flush()
+        except OSError:
+            self._disconnect()
+            raise
+
+    # Sends many lines to VDR without waiting for a reply in between. The
+    # lines are joined and written in large chunks.
+    #
+    # replies: Number of replies VDR sends for the lines
+    def _sendlines(self, lines, replies: int = 1):
+        if self._metrics is not None:
+            self._metrics.sent()
+        if self._deadline is not None:
+            self.socket.settimeout(self._timeout())
+        self._pending += replies
+        buffer = []
+        try:
+            for line in lines:
+                buffer.append(line)
+                if len(buffer) >= SEND_BATCHLINES:
+                    buffer.append("")
+                    self._writefh.write("\n".join(buffer))
+                    buffer.clear()
+            buffer.append("")
+            self._writefh.write("\n".join(buffer))
+            self._writefh.flush()
+        except OSError:
+            self._disconnect()
+            raise
+
+
+# Context manager returned by "SVDRPConnection.deadline". The time limit is
+# fixed when it is created, so it may be entered again (by generators which
+# only set it while they run).
+class _Deadline:
+    def __init__(self, connection, seconds):
+        self.connection = connection
+        self.end = None if seconds is None else time.monotonic() + seconds
+        self._previous = None
+        self._value = None
+
+    def __enter__(self):
+        connection = self.connection
+        self._previous = connection._deadline
+        if self.end is not None and (self._previous is None or self.end < self._previous):
+            connection._deadline = self.end
+        self._value = connection._deadline
+        return connection
+
+    def __exit__(self, exc_type, exc, tb):
+        # Only restore the previous deadline if ours is still set. If
+        # deadlines ended out of order, then the other one is kept.
+        connection = self.connection
+        if connection._deadline != self._value:
+            return
+        # Commands under an outer deadline set their own timeouts
+        if self._previous is None and self._value is not None and connection.socket is not None:
+            connection.socket.settimeout(connection.timeout)
+        connection._deadline = self._previous
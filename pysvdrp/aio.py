@@ -0,0 +1,313 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import deque
+from itertools import chain
+from pysvdrp import SVDRPConnection, RECV_BUFSIZE, SEND_BATCHLINES
+from pysvdrp.channels import Channel, _lstc_command, _parse_channels, _parse_channel, _parse_move
+from pysvdrp.plugins import _parse_plugins
+from pysvdrp.epg import Schedules, _lste_command, _clre_command, _parse_clre, _read_schedules, _pute_transactions
+from pysvdrp.exceptions import SVDRPException, ActionNotTaken
+
+# asyncio variant of "SVDRPConnection". Offers the same commands as awaitable
+# methods so one event loop can talk to many VDR instances at once.
+#
+#   async with AsyncSVDRPConnection("vdr.local") as vdr:
+#       channels = await vdr.list_channels()
+class AsyncSVDRPConnection:
+    # Greeting and reply parsing is shared with the blocking implementation
+    _asctime2time = SVDRPConnection._asctime2time
+    _parsegreeting = SVDRPConnection._parsegreeting
+    _feed = SVDRPConnection._feed
+    _trackchannel = SVDRPConnection._trackchannel
+    _decode = SVDRPConnection._decode
+    _parsemsg = SVDRPConnection._parsemsg
+
+    # The shared methods report to a "CommandMetrics" object if set. The
+    # asyncio connection is not instrumented.
+    _metrics = None
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6419) -> None:
+        """
+        Prepares a SVDRP connection. The connection is established with
+        "connect()" or by using the object as async context manager. If a
+        command is cancelled (for example by "asyncio.wait_for") in the
+        middle of its reply or VDR closed the connection, then the next
+        command reconnects.
+
+        host: VDR host to connect to (default: 127.0.0.1)
+        port: SVDRP port to use (default: 6419)
+        """
+        self.host = host
+        self.port = port
+        self._fallbackencodings = {}
+        self._reader = None
+        self._writer = None
+
+        # Number of replies VDR still has to send. Replies that were not read
+        # completely (cancelled or timed out commands) make us reconnect
+        # before the next command.
+        self._pending = 0
+
+    async def connect(self):
+        """
+        Establishes the SVDRP connection
+        """
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._rbuf = b""
+        self._lines = deque()
+        self._channel = None
+        self._pending = 1
+
+        # Read VDR's status welcome message
+        self.encoding = "ascii"
+        self._parsegreeting(*await self._recvmsg())
+        return self
+
+    async def close(self):
+        """
+        Properly disconnects from VDR to prevent "lost connection" log messages
+        """
+        if self._writer is None:
+            return
+
+        # Only possible if no reply is pending. We don't care about errors
+        # happening here.
+        if not self._pending:
+            try:
+                self._writer.write(b"QUIT\n")
+                await self._writer.drain()
+            except:
+                pass
+
+        self._disconnect()
+
+    # Closes the connection without saying goodbye to VDR
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._pending = 0
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # Receives a one-line message from VDR
+    async def _recvmsg(self):
+        lines = self._lines
+        while not lines:
+            data = await self._reader.read(RECV_BUFSIZE)
+            if not data:
+                raise ConnectionError("Connection closed by VDR")
+            self._feed(data)
+        line = lines.popleft()
+        if line[3:4] != "-":
+            self._pending -= 1
+        return self._parsemsg(line)
+
+    # Receives a list from VDR
+    async def _recvlist(self):
+        status, message = await self._recvmsg()
+        data = [message]
+        while status < 0:
+            status, message = await self._recvmsg()
+            data.append(message)
+        return status, data
+
+    # Sends a command to VDR
+    async def _send(self, command: str):
+        # Reconnect if the last reply was not read completely or VDR closed
+        # the connection
+        if self._pending or self._writer is None or self._reader.at_eof():
+            self._disconnect()
+            await self.connect()
+        self._pending += 1
+        self._writer.write((command + "\n").encode(self.encoding))
+        await self._writer.drain()
+
+    # Sends many lines to VDR without waiting for a reply in between. The
+    # lines are joined and written in large chunks.
+    async def _sendlines(self, lines):
+        self._pending += 1
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= SEND_BATCHLINES:
+                buffer.append("")
+                self._writer.write("\n".join(buffer).encode(self.encoding))
+                buffer.clear()
+                await self._writer.drain()
+        buffer.append("")
+        self._writer.write("\n".join(buffer).encode(self.encoding))
+        await self._writer.drain()
+
+    async def list_channels(self, withgroups: bool = False):
+        """
+        Requests a channel list from VDR.
+        Returned is a list of "Channel" objects where each object represents
+        one channel.
+
+        withgroups: If "True" the returned list contains the group separators
+        """
+        await self._send(_lstc_command(withgroups))
+        status, data = await self._recvlist()
+        return _parse_channels(data)
+
+    async def get_channel(self, channel):
+        """
+        Requests information for one channel. The result is returned as a
+        "Channel" object.
+
+        channel: The channel to request. Either a channel number or channel id
+        """
+        await self._send("LSTC " + str(channel))
+        status, message = await self._recvmsg()
+        return _parse_channel(message)
+
+    async def move_channel(self, source, target):
+        """
+        Moves channel with the current channel number "source" to channel
+        number "target"
+        """
+        await self._send("MOVC " + str(source) + " " + str(target))
+        status, message = await self._recvmsg()
+        return _parse_move(status, message)
+
+    async def delete_channel(self, channel):
+        """
+        Deletes given channel. "channel" may be either a channel number, a
+        channel id or an "Channel" object whose channel id is used.
+        """
+        if isinstance(channel, Channel):
+            channel = channel.channelid
+        if isinstance(channel, str):
+            channel = (await self.get_channel(channel)).number
+
+        await self._send("DELC " + str(channel))
+        status, message = await self._recvmsg()
+
+        if status != 250:
+            raise SVDRPException(message, status)
+
+    async def list_epg(self, channel = '', filter = ''):
+        """
+        Gets EPG data. The EPG data is returned as "Schedules" object
+
+        channel: Optional channel to get EPG for (EPG for all channels if not
+                 given). May be one of "channel number", "channel id" and
+                 "Channel object"
+        filter: [ now | next | at <Time> ]
+        """
+        schedules = Schedules()
+        async for channelid, schedule in self.iter_epg(channel, filter):
+            schedules[channelid] = schedule
+        return schedules
+
+    async def iter_epg(self, channel = '', filter = ''):
+        """
+        Gets EPG data as a stream. Yields a (channelid, Schedule) tuple for
+        each channel as soon as it is completely received from VDR.
+
+        The connection can't be used for other commands until the generator
+        is exhausted or closed with "aclose()". If it is closed or cancelled
+        early, then the rest of the reply is dropped and the next command
+        reconnects.
+
+        channel: Optional channel to get EPG for (EPG for all channels if not
+                 given). May be one of "channel number", "channel id" and
+                 "Channel object"
+        filter: [ now | next | at <Time> ]
+        """
+        await self._send(_lste_command(channel, filter))
+
+        try:
+            status, message = await self._recvmsg()
+        except ActionNotTaken:
+            return # Just ignore "No schedule found" error
+
+        # Collect one channel block at a time and parse it as soon as the
+        # closing "c" line arrives
+        block = []
+        while status < 0:
+            block.append(message)
+            if message[0] == "c":
+                for result in _read_schedules(iter(block)):
+                    yield result
+                block.clear()
+            status, message = await self._recvmsg()
+
+    async def clear_epg(self, channel = ""):
+        """
+        Clears epg data
+
+        channel: Optional channel to clear EPG for (all channels if not given)
+                 May be one of "channel number", "channel id" and
+                 "Channel object"
+
+        Returns True if there was EPG data to clear. False otherwise.
+        """
+        await self._send(_clre_command(channel))
+
+        # Catch the ActionNotTaken exception raised if no EPG data exists
+        try:
+            status, message = await self._recvmsg()
+        except ActionNotTaken:
+            return False
+
+        return _parse_clre(status, message)
+
+    async def put_epg(self, data, maxevents: int = 0):
+        """
+        Sends EPG data to VDR
+
+        data: EPG data as "Schedules", "Schedule" or "Event" object or as
+              string
+        maxevents: Optional limit for the number of events sent in one PUTE
+                   transaction. Only used if "data" is a "Schedules" object.
+                   If a transaction fails, then the remaining ones are still
+                   sent and the first error is raised afterwards.
+        """
+        errors = []
+        for lines in _pute_transactions(data, maxevents):
+            await self._send("PUTE")
+            status, message = await self._recvmsg()
+            if status != 354:
+                raise SVDRPException(message, status)
+
+            await self._sendlines(chain(lines, (".",)))
+
+            try:
+                status, message = await self._recvmsg()
+                if status != 250:
+                    raise SVDRPException(message, status)
+            except SVDRPException as e:
+                errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+    async def list_plugins(self):
+        """
+        Returns a list of plugins loaded into VDR
+        """
+        await self._send("PLUG")
+        status, data = await self._recvlist()
+        return _parse_plugins(data)
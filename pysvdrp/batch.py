@@ -0,0 +1,216 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Command pipelining. Commands queued in a batch are written to VDR back to
+# back and the replies are read afterwards, so a batch of small commands
+# costs about one round trip instead of one per command:
+#
+#   with conn.batch() as batch:
+#       results = [batch.get_channel(number) for number in range(1, 101)]
+#   channels = [result.result() for result in results]
+#
+# VDR executes the commands in the given order, exactly like separate calls.
+
+from pysvdrp.channels import Channel, _parse_channel, _parse_move, _invalidate_channelcache, _channel_number
+from pysvdrp.epg import _clre_command, _parse_clre
+from pysvdrp.exceptions import SVDRPException, ActionNotTaken
+
+# Number of commands written before their replies are read. Limits what
+# piles up in the socket buffers.
+DEFAULT_WINDOW = 64
+
+
+def batch(self, window: int = DEFAULT_WINDOW):
+    """
+    Returns a "Batch" to queue commands in. Use it as context manager. The
+    connection can't be used for other commands until the batch is left.
+
+    window: Number of commands sent before their replies are read
+    """
+    return Batch(self, window)
+
+
+# Reply of one batched command. Available after the batch was sent.
+class BatchResult:
+    def __init__(self, command):
+        self.command = command
+        self.done = False
+        self._value = None
+        self._exception = None
+
+    def result(self):
+        """
+        Returns the result of the command. Error replies from VDR are
+        raised as the same exceptions the connection methods raise.
+        """
+        if not self.done:
+            raise RuntimeError("Batch was not sent, yet")
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+    @property
+    def exception(self):
+        """
+        The exception raised for the command or None
+        """
+        return self._exception
+
+
+class Batch:
+    def __init__(self, connection, window: int = DEFAULT_WINDOW) -> None:
+        self.connection = connection
+        self.window = window
+        self.results = []
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Nothing was sent since the last flush. Drop what is queued.
+            self._pending.clear()
+            return
+        self.flush()
+        for result in self.results:
+            if result.exception is not None:
+                raise result.exception
+
+    def flush(self):
+        """
+        Sends all queued commands and reads their replies. Called when the
+        batch is left.
+        """
+        pending = self._pending
+        while pending:
+            window = pending[:self.window]
+            del pending[:self.window]
+            self.connection._prepare()
+            self.connection._sendlines([result.command for result, parse, onerror in window], len(window))
+            for result, parse, onerror in window:
+                _receive(self.connection, result, parse, onerror)
+
+    def command(self, command: str):
+        """
+        Queues a raw SVDRP command. Its result is the (status, lines) tuple
+        of the reply.
+        """
+        return self._queue(command, _raw_reply)
+
+    def get_channel(self, channel):
+        """
+        Queues a "get_channel". The channel is always requested from VDR,
+        a "ChannelCache" is not used.
+
+        channel: The channel to request. Either a channel number or channel id
+        """
+        return self._queue("LSTC " + str(channel), _channel_reply)
+
+    def move_channel(self, source, target):
+        """
+        Queues a "move_channel". Later queued commands see the new channel
+        numbers.
+        """
+        _invalidate_channelcache(self.connection)
+        return self._queue("MOVC " + str(source) + " " + str(target), _move_reply)
+
+    def delete_channel(self, channel):
+        """
+        Queues a "delete_channel". Only channel numbers are pipelined. For
+        channel ids and "Channel" objects the number is requested first,
+        which sends the commands queued so far. Deleting changes the numbers
+        of the following channels, so delete from the highest number down.
+        """
+        if isinstance(channel, Channel):
+            channel = channel.channelid
+        if isinstance(channel, str) and not channel.isdigit():
+            self.flush()
+            channel = _channel_number(self.connection, channel)
+        _invalidate_channelcache(self.connection)
+        return self._queue("DELC " + str(channel), _status_reply)
+
+    def new_channel(self, channel):
+        """
+        Queues a "new_channel". Its result is the new "Channel".
+        """
+        _invalidate_channelcache(self.connection)
+        return self._queue("NEWC " + str(channel), _channel_reply)
+
+    def modify_channel(self, number, channel):
+        """
+        Queues a "modify_channel". Its result is the modified "Channel".
+        Only channel numbers are pipelined. For channel ids the number is
+        requested first, which sends the commands queued so far.
+        """
+        if isinstance(number, str) and not number.isdigit():
+            self.flush()
+            number = _channel_number(self.connection, number)
+        _invalidate_channelcache(self.connection)
+        return self._queue("MODC " + str(number) + " " + str(channel), _channel_reply)
+
+    def clear_epg(self, channel = ""):
+        """
+        Queues a "clear_epg". Its result is True if there was EPG data to
+        clear, False otherwise.
+        """
+        return self._queue(_clre_command(channel), _clre_reply, _clre_error)
+
+    def _queue(self, command, parse, onerror = None):
+        result = BatchResult(command)
+        self.results.append(result)
+        self._pending.append((result, parse, onerror))
+        return result
+
+
+# Reads the reply of one batched command into its result. Only error
+# replies are kept as result, other errors leave the connection unusable.
+def _receive(connection, result, parse, onerror):
+    try:
+        status, data = connection._recvlist()
+        result._value = parse(status, data)
+    except SVDRPException as e:
+        if onerror is None:
+            result._exception = e
+        else:
+            try:
+                result._value = onerror(e)
+            except SVDRPException as e:
+                result._exception = e
+    result.done = True
+
+
+def _raw_reply(status, data):
+    return status, data
+
+def _channel_reply(status, data):
+    return _parse_channel(data[0])
+
+def _move_reply(status, data):
+    return _parse_move(status, data[0])
+
+def _status_reply(status, data):
+    if status != 250:
+        raise SVDRPException(data[0], status)
+
+def _clre_reply(status, data):
+    return _parse_clre(status, data[0])
+
+# "No EPG data found" is no error for "clear_epg"
+def _clre_error(exception):
+    if isinstance(exception, ActionNotTaken):
+        return False
+    raise exception
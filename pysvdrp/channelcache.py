@@ -0,0 +1,183 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Cache for channel lists. It is enabled by assigning it to a connection:
+#
+#   conn.channelcache = ChannelCache(maxage=300, path="channels.json")
+#   channels = conn.list_channels()   # LSTC is only sent if needed
+#
+# "list_channels" and "get_channel" are answered from the cache. Commands
+# sent through pysvdrp which modify the channel list ("move_channel",
+# "delete_channel", ...) invalidate it. Changes done by other SVDRP clients
+# or on the VDR itself are only noticed after "maxage" seconds.
+#
+# The returned "Channel" objects are shared with the cache and must not be
+# modified.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pysvdrp.channels import Channels, _lstc_command, _parse_channels
+
+class ChannelCache:
+    def __init__(self, maxage: float = None, path: str = None) -> None:
+        """
+        Creates a channel list cache. One cache may be shared by several
+        connections, also to different VDR instances.
+
+        maxage: Seconds after which a cached list is checked against VDR
+                again (default: only when invalidated)
+        path: Optional JSON file to persist the cached lists in. Existing
+              content is loaded, so a restarted process can skip the first
+              channel dump. Loaded lists are subject to "maxage", too.
+        """
+        self.maxage = maxage
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def channels(self, connection, withgroups: bool = False):
+        """
+        Returns the channel list of the VDR "connection" is connected to as
+        new "Channels" object
+
+        withgroups: If "True" the returned list contains the group separators
+        """
+        channels = self._getentry(connection).channels
+        if withgroups:
+            return Channels(channels)
+        return Channels([channel for channel in channels if not channel.groupsep])
+
+    def find(self, connection, channel):
+        """
+        Returns the cached "Channel" with the given number or channel id or
+        None if it is not in the cached list
+        """
+        channels = self._getentry(connection).channels
+        try:
+            if isinstance(channel, str) and not channel.isdigit():
+                index = channels.find_by_channelid(channel)
+            else:
+                index = channels.find_by_number(int(channel))
+        except ValueError:
+            return None
+        if channels[index].groupsep:
+            return None
+        return channels[index]
+
+    def digest(self, connection):
+        """
+        Returns the digest of the raw LSTC reply the cached list of the VDR
+        "connection" is connected to was parsed from or None
+        """
+        with self._lock:
+            entry = self._entries.get(_key(connection))
+        return entry.digest if entry is not None else None
+
+    def invalidate(self, connection = None):
+        """
+        Marks the cached list of the VDR "connection" is connected to (or of
+        all VDRs) as outdated. The next access checks it against VDR.
+        """
+        with self._lock:
+            if connection is None:
+                entries = self._entries.values()
+            else:
+                entry = self._entries.get(_key(connection))
+                entries = [entry] if entry is not None else []
+            for entry in entries:
+                entry.time = None
+
+    def clear(self):
+        """
+        Drops all cached lists
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.path is not None:
+            self._save()
+
+    # Returns the entry for "connection", refreshed if outdated. A refresh
+    # downloads the channel list. It is only parsed if its digest changed.
+    def _getentry(self, connection):
+        key = _key(connection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.time is not None and \
+               (self.maxage is None or time.time() - entry.time < self.maxage):
+                return entry
+
+        connection._send(_lstc_command(True))
+        status, data = connection._recvlist()
+        digest = _digest(data)
+
+        with self._lock:
+            if entry is None or entry.digest != digest:
+                entry = _Entry(data, digest)
+                self._entries[key] = entry
+                changed = True
+            else:
+                changed = entry.time is None
+            entry.time = time.time()
+        if changed and self.path is not None:
+            self._save()
+        return entry
+
+    def _load(self):
+        with open(self.path, encoding="utf-8", errors="surrogateescape") as fp:
+            content = json.load(fp)
+        for item in content:
+            # Skip entries that don't match their digest (edited by hand)
+            if _digest(item["lines"]) != item["digest"]:
+                continue
+            entry = _Entry(item["lines"], item["digest"])
+            entry.time = item["time"]
+            self._entries[(item["host"], item["port"])] = entry
+
+    # Writes the cache file. It is replaced atomically.
+    def _save(self):
+        with self._lock:
+            content = [{"host": host, "port": port, "digest": entry.digest,
+                        "time": entry.time, "lines": entry.lines}
+                       for (host, port), entry in self._entries.items()]
+        temppath = self.path + ".tmp"
+        with open(temppath, "w", encoding="utf-8", errors="surrogateescape") as fp:
+            json.dump(content, fp, ensure_ascii=False)
+        os.replace(temppath, self.path)
+
+
+# Cached channel list of one VDR. "time" is None if invalidated.
+class _Entry:
+    def __init__(self, lines, digest):
+        self.lines = lines
+        self.digest = digest
+        self.channels = _parse_channels(lines)
+        self.time = None
+
+
+def _key(connection):
+    return (connection.host, connection.port)
+
+def _digest(lines):
+    digest = hashlib.sha1()
+    for line in lines:
+        digest.update(line.encode("utf-8", errors="surrogateescape"))
+        digest.update(b"\n")
+    return digest.hexdigest()
@@ -16,56 +16,61 @@
 
 from collections import UserList
 from pysvdrp.exceptions import SVDRPException
+from pysvdrp.metrics import instrumented
 
-def list_channels(self, withgroups: bool = False):
+@instrumented
+def list_channels(self, withgroups: bool = False, deadline: float = None):
     """
     Requests a channel list from VDR.
     Returned is a list of "Channel" objects where each object represents one
     channel.
 
     withgroups: If "True" the returned list contains the group separators
+    deadline: Optional time limit in seconds for the whole command. See
+              "SVDRPConnection.deadline".
     """
-    self._send("LSTC" + (" :groups" if withgroups else ""))
-    status, data = self._recvlist()
-    result = Channels()
-    groupid = 0
-    for line in data:
-        number, channelstring = line.split(" ", 1)
-        channel = Channel(channelstring, number)
-        if (channel.groupsep):
-            groupid += 1
-            channel.groupnumber = groupid
-        result.append(channel)
-    return result
+    with self.deadline(deadline):
+        if self.channelcache is not None:
+            return self.channelcache.channels(self, withgroups)
+
+        self._send(_lstc_command(withgroups))
+        status, data = self._recvlist()
+    return _parse_channels(data)
 
 
-def get_channel(self, channel):
+@instrumented
+def get_channel(self, channel, deadline: float = None):
     """
     Requests information for one channel. The result is returned as a
     "Channel" object.
 
     channel: The channel to request. Either a channel number or channel id
+    deadline: Optional time limit in seconds for the whole command. See
+              "SVDRPConnection.deadline".
     """
-    self._send("LSTC " + str(channel))
-    status, message = self._recvmsg()
-    number, channelstring = message.split(" ", 1)
-    return Channel(channelstring, number)
+    with self.deadline(deadline):
+        if self.channelcache is not None:
+            result = self.channelcache.find(self, channel)
+            if result is not None:
+                return result
+
+        self._send("LSTC " + str(channel))
+        status, message = self._recvmsg()
+    return _parse_channel(message)
 
 
+@instrumented
 def move_channel(self, source, target):
     """
     Moves channel with the current channel number "source" to channel
     number "target"
     """
     self._send("MOVC " + str(source) + " " + str(target))
+    _invalidate_channelcache(self)
     status, message = self._recvmsg()
+    return _parse_move(status, message)
 
-    if status != 250:
-        raise SVDRPException(message, status)
-
-    parts = message.split('"')
-    return int(parts[1]), int(parts[3])
-
+@instrumented
 def delete_channel(self, channel):
     """
     Deletes given channel. "channel" may be either a channel number, a channel
@@ -78,19 +83,136 @@ def delete_channel(self, channel):
 
     # TODO: Allow this to pass directly for VDR versions with allow channelids
     # directly for "DELC"
-    if isinstance(channel, str):
-        channel = self.get_channel(channel).number
+    if isinstance(channel, str) and not channel.isdigit():
+        channel = _channel_number(self, channel)
 
     self._send("DELC " + str(channel))
+    _invalidate_channelcache(self)
+    status, message = self._recvmsg()
+
+    if status != 250:
+        raise SVDRPException(message, status)
+
+
+@instrumented
+def new_channel(self, channel):
+    """
+    Adds a new channel to the end of the channel list. Returns the new
+    channel as "Channel" object with the number VDR assigned to it.
+
+    channel: The channel to add. Either a "Channel" object or a channel
+             string (LSTC format without number)
+    """
+    self._send("NEWC " + str(channel))
+    _invalidate_channelcache(self)
+    status, message = self._recvmsg()
+    return _parse_channel(message)
+
+
+@instrumented
+def modify_channel(self, number, channel):
+    """
+    Replaces the settings of an existing channel. Returns the modified
+    channel as "Channel" object.
+
+    number: Number of the channel to modify. A channel id is also accepted,
+            but costs an extra request to find the number.
+    channel: The new settings. Either a "Channel" object or a channel string
+             (LSTC format without number)
+    """
+    if isinstance(number, str) and not number.isdigit():
+        number = _channel_number(self, number)
+
+    self._send("MODC " + str(number) + " " + str(channel))
+    _invalidate_channelcache(self)
     status, message = self._recvmsg()
+    return _parse_channel(message)
+
+
+# Returns the current number of the channel with the given id. Always asks
+# VDR as a cached channel list may have outdated numbers.
+def _channel_number(connection, channelid):
+    connection._send("LSTC " + channelid)
+    status, message = connection._recvmsg()
+    return _parse_channel(message).number
+
+# Called by commands which modify the channel list
+def _invalidate_channelcache(connection):
+    if connection.channelcache is not None:
+        connection.channelcache.invalidate(connection)
+
+
+# Helpers shared by the blocking and the asyncio connection. They build the
+# command strings and parse the replies.
+def _lstc_command(withgroups: bool):
+    return "LSTC" + (" :groups" if withgroups else "")
+
+# Parses LSTC reply lines. Does the same as "Channel.__init__", but without
+# a method call per channel and with less temporary objects, as channel
+# lists with thousands of channels are requested often. Keep both in sync.
+def _parse_channels(data):
+    channels = []
+    append = channels.append
+    new = Channel.__new__
+    groupid = 0
+    for line in data:
+        number, channelstring = line.split(" ", 1)
+        fields = channelstring.split(":")
+        if len(fields) != 13 or not fields[0]:
+            # Group separators (and broken lines which raise here)
+            channel = Channel(channelstring, number)
+            if channel.groupsep:
+                groupid += 1
+                channel.groupnumber = groupid
+            append(channel)
+            continue
+
+        fullname, frequency, parameters, source, srate, vpid, apid, tpid, caid, sid, nid, tid, rid = fields
+        channel = new(Channel)
+        channel._channelidkey = None
+        channel.number = int(number)
+        channel.groupsep = False
+        fullname, separator, channel.provider = fullname.partition(";")
+        channel.name, separator, channel.shortname = fullname.partition(",")
+        channel.frequency = int(frequency)
+        channel.parameters = parameters
+        channel.source = source
+        channel.srate = int(srate)
+        channel.vpid = vpid
+        channel.apid = apid
+        channel.tpid = tpid
+        channel.caid = caid
+        channel.sid = int(sid)
+        channel.nid = int(nid)
+        channel.tid = int(tid)
+        channel.rid = int(rid)
+        append(channel)
+
+    result = Channels()
+    result.data = channels
+    return result
 
+def _parse_channel(message):
+    number, channelstring = message.split(" ", 1)
+    return Channel(channelstring, number)
+
+def _parse_move(status, message):
     if status != 250:
         raise SVDRPException(message, status)
 
+    parts = message.split('"')
+    return int(parts[1]), int(parts[3])
+
 
 # Objects of type "Channel" encapsulate the information of one channel
 class Channel:
+    __slots__ = ("number", "groupsep", "groupnumber", "name", "shortname",
+                 "provider", "frequency", "parameters", "source", "srate",
+                 "vpid", "apid", "tpid", "caid", "sid", "nid", "tid", "rid",
+                 "_channelid", "_channelidkey")
+
     def __init__(self, channelstring: str = "", number: int = 0):
+        self._channelidkey = None
         if not channelstring:
             return
 
@@ -160,6 +282,12 @@ class Channel:
         if (self.groupsep):
             return "GROUP" + str(self.groupnumber)
 
+        # Building the channel id is expensive, so it is cached. The cache is
+        # dropped if any of the attributes, the id is built from, changes.
+        key = (self.source, self.nid, self.tid, self.sid, self.rid, self.frequency, self.parameters)
+        if self._channelidkey == key:
+            return self._channelid
+
         parts = [
             self.source,
             str(self.nid),
@@ -167,8 +295,10 @@ class Channel:
             str(self.sid)
         ]
         if self.rid:
-            parts.append(self.rid)
-        return "-".join(parts)
+            parts.append(str(self.rid))
+        self._channelid = "-".join(parts)
+        self._channelidkey = key
+        return self._channelid
 
     # Re-merges channel info into a channel string
     def __str__(self):
@@ -200,16 +330,58 @@ class Channel:
         ])
 
 
-# "Special" list for channels with custom "find" methods
+# "Special" list for channels with custom "find" methods. Lookups use
+# indexes which are built on first use and dropped when the list changes.
+# If a channel is modified in place, call "reindex()".
 class Channels(UserList):
+    _indexes = None
+
     def find_by_number(self, aNumber):
-        for index, channel in enumerate(self):
-            if channel.number == aNumber:
-                return index;
-        raise ValueError("Channel number '" + str(aNumber) + "' is not in channel list");
+        index = self._getindexes()[0].get(aNumber)
+        if index is None:
+            raise ValueError("Channel number '" + str(aNumber) + "' is not in channel list");
+        return index
 
     def find_by_channelid(self, aID):
-        for index, channel in enumerate(self):
-            if channel.channelid == aID:
-                return index;
-        raise ValueError("Channel ID '" + str(aID) + "' is not in channel list");
+        index = self._getindexes()[1].get(aID)
+        if index is None:
+            raise ValueError("Channel ID '" + str(aID) + "' is not in channel list");
+        return index
+
+    def find_by_key(self, source, nid, tid, sid):
+        index = self._getindexes()[2].get((source, nid, tid, sid))
+        if index is None:
+            raise ValueError("Channel '" + "-".join(map(str, (source, nid, tid, sid))) + "' is not in channel list");
+        return index
+
+    def reindex(self):
+        self._indexes = None
+
+    # Returns the (number, channel id, key tuple) indexes. Like a linear
+    # search would, every index points to the first matching channel.
+    def _getindexes(self):
+        if self._indexes is None:
+            bynumber = {}
+            bychannelid = {}
+            bykey = {}
+            for index, channel in enumerate(self.data):
+                bynumber.setdefault(channel.number, index)
+                bychannelid.setdefault(channel.channelid, index)
+                if not channel.groupsep:
+                    bykey.setdefault((channel.source, channel.nid, channel.tid, channel.sid), index)
+            self._indexes = (bynumber, bychannelid, bykey)
+        return self._indexes
+
+
+# Wraps the list modifying methods of "UserList" so they drop the indexes
+def _dropindexes(name):
+    method = getattr(UserList, name)
+    def wrapper(self, *args, **kwargs):
+        self._indexes = None
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append",
+              "insert", "pop", "remove", "clear", "extend", "reverse", "sort"):
+    setattr(Channels, _name, _dropindexes(_name))
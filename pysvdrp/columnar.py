@@ -0,0 +1,255 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Column oriented EPG data for analytics. One row per event, no "Event"
+# objects are created:
+#
+#   columns = conn.list_epg_columns()
+#   arrays = columns.to_numpy()          # needs NumPy
+#   evening = arrays["starttime"] % 86400 >= 72000
+#   print(arrays["duration"][evening].sum())
+#   print(columns.title[0], columns.channelids[columns.channel[0]])
+
+from array import array
+from itertools import accumulate, chain, islice, repeat
+from operator import is_
+from pysvdrp.epg import Schedules, Schedule, Event, _lste_command
+from pysvdrp.exceptions import ActionNotTaken
+from pysvdrp.metrics import instrumented
+
+# Numeric columns and their array type codes
+NUMERIC_COLUMNS = (("channel", "I"), ("eventid", "I"), ("starttime", "q"),
+                   ("duration", "i"), ("tableid", "B"), ("version", "B"))
+
+# Text columns. They hold the values an "Event" would have. "contents" is
+# the space separated "G" line, "components" the "X" lines separated by
+# newlines.
+STRING_COLUMNS = ("title", "shorttext", "description", "contents",
+                  "parentalrating", "components", "vps", "aux")
+
+
+@instrumented
+def list_epg_columns(self, channel = '', filter = '', deadline: float = None):
+    """
+    Gets EPG data as "EPGColumns" object. Parses the reply directly into
+    columns without creating "Event" objects.
+
+    channel: Optional channel to get EPG for (EPG for all channels if not given)
+             May be one of "channel number", "channel id" and "Channel object"
+    filter: [ now | next | at <Time> ]
+    deadline: Optional time limit in seconds for the whole command. See
+              "SVDRPConnection.deadline".
+    """
+    with self.deadline(deadline):
+        self._send(_lste_command(channel, filter))
+
+        lines = self._recviter()
+        try:
+            return EPGColumns.read(lines)
+        except ActionNotTaken:
+            return EPGColumns() # Just ignore "No schedule found" error
+        finally:
+            # Keep the connection usable if parsing failed
+            for line in lines:
+                pass
+
+
+# Texts of one column stored as UTF-8 data plus an array of offsets. Row "i"
+# is data[offsets[i]:offsets[i + 1]]. Missing values (None) are marked in
+# "nulls".
+class StringColumn:
+    def __init__(self, values = ()) -> None:
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.nulls = bytearray()
+        self.extend(values)
+
+    def extend(self, values):
+        """
+        Appends the given strings (or None values)
+        """
+        parts = [b"" if value is None else value.encode("utf-8", errors="surrogateescape")
+                 for value in values]
+        self.data += b"".join(parts)
+        self.offsets.extend(islice(accumulate(chain((self.offsets[-1],), map(len, parts))), 1, None))
+        self.nulls.extend(map(is_, values, repeat(None)))
+
+    def __len__(self):
+        return len(self.nulls)
+
+    def __getitem__(self, row):
+        if self.nulls[row]:
+            return None
+        if row < 0:
+            row += len(self.nulls)
+        return self.data[self.offsets[row]:self.offsets[row + 1]].decode("utf-8", errors="surrogateescape")
+
+    def __iter__(self):
+        for row in range(len(self.nulls)):
+            yield self[row]
+
+
+class EPGColumns:
+    def __init__(self) -> None:
+        """
+        Creates empty columns. Use "read", "from_schedules" or
+        "list_epg_columns" to get filled ones.
+        """
+        # Channel ids and names. The "channel" column indexes these lists.
+        self.channelids = []
+        self.channelnames = []
+        for name, typecode in NUMERIC_COLUMNS:
+            setattr(self, name, array(typecode))
+        for name in STRING_COLUMNS:
+            setattr(self, name, StringColumn())
+
+    def __len__(self):
+        return len(self.eventid)
+
+    @classmethod
+    def read(cls, iterator: iter):
+        """
+        Parses LSTE reply lines into columns
+        """
+        columns = cls()
+        numeric = [getattr(columns, name) for name, typecode in NUMERIC_COLUMNS]
+        appendchannel, appendeventid, appendstarttime, appendduration, \
+            appendtableid, appendversion = [column.append for column in numeric]
+        texts = [getattr(columns, name) for name in STRING_COLUMNS]
+        rows = []
+        appendrow = rows.append
+
+        channel = -1
+        fields = None
+        for line in iterator:
+            tag = line[0]
+            if tag == "E":
+                eventid, starttime, duration, tableid, version = line.split(" ")[1:]
+                appendchannel(channel)
+                appendeventid(int(eventid))
+                appendstarttime(int(starttime))
+                appendduration(int(duration))
+                appendtableid(int(tableid, 16))
+                appendversion(int(version, 16))
+                fields = [None] * len(STRING_COLUMNS)
+            elif tag == "e":
+                appendrow(fields)
+                fields = None
+            elif tag == "C":
+                channelid, channelname = line.split(" ", 2)[1:]
+                columns.channelids.append(channelid)
+                columns.channelnames.append(channelname)
+                channel += 1
+            elif tag == "c":
+                _extend_texts(texts, rows)
+            elif fields is None:
+                raise ValueError("Unknown tag while parsing EPG Schedules: " + tag)
+            elif tag == "X":
+                if fields[5] is None:
+                    fields[5] = line[2:]
+                else:
+                    fields[5] += "\n" + line[2:]
+            else:
+                index = _TAG_COLUMNS.get(tag)
+                if index is None:
+                    raise ValueError("Unknown tag while parsing EPG: " + tag)
+                fields[index] = line[2:]
+
+        _extend_texts(texts, rows)
+        return columns
+
+    @classmethod
+    def from_schedules(cls, schedules):
+        """
+        Converts a "Schedules" object into columns
+        """
+        columns = cls()
+        numeric = [getattr(columns, name) for name, typecode in NUMERIC_COLUMNS]
+        texts = [[] for name in STRING_COLUMNS]
+        for channel, (channelid, schedule) in enumerate(schedules.items()):
+            columns.channelids.append(channelid)
+            columns.channelnames.append(schedule.channelname)
+            for event in schedule:
+                for column, value in zip(numeric, (channel, event.eventid, event.starttime, event.duration,
+                                                   event.tableid, event.version)):
+                    column.append(value)
+                for column, name in zip(texts, STRING_COLUMNS):
+                    value = getattr(event, name)
+                    if value is not None and name == "contents":
+                        value = " ".join(value)
+                    elif value is not None and name == "components":
+                        value = "\n".join(value)
+                    column.append(value)
+        for name, values in zip(STRING_COLUMNS, texts):
+            setattr(columns, name, StringColumn(values))
+        return columns
+
+    def event(self, row: int):
+        """
+        Returns the given row as "Event" object
+        """
+        event = Event()
+        event.eventid = self.eventid[row]
+        event.starttime = self.starttime[row]
+        event.duration = self.duration[row]
+        event.tableid = self.tableid[row]
+        event.version = self.version[row]
+        for name in STRING_COLUMNS:
+            setattr(event, name, getattr(self, name)[row])
+        if event.contents is not None:
+            event.contents = event.contents.split(" ")
+        if event.components is not None:
+            event.components = event.components.split("\n")
+        return event
+
+    def to_schedules(self):
+        """
+        Converts the columns back to a "Schedules" object
+        """
+        schedules = Schedules()
+        for channelid, channelname in zip(self.channelids, self.channelnames):
+            schedule = Schedule()
+            schedule.channelname = channelname
+            schedules[channelid] = schedule
+        for row, channel in enumerate(self.channel):
+            schedules[self.channelids[channel]].append(self.event(row))
+        return schedules
+
+    def to_numpy(self):
+        """
+        Returns a dict with a NumPy array for each numeric column. The arrays
+        share memory with the columns. Requires NumPy.
+        """
+        import numpy
+        return {name: numpy.frombuffer(getattr(self, name), dtype=typecode)
+                for name, typecode in NUMERIC_COLUMNS}
+
+
+# Column indexes of the single line tags
+_TAG_COLUMNS = {"T": 0, "S": 1, "D": 2, "G": 3, "R": 4, "V": 6, "@": 7}
+
+# Moves collected rows of text fields into the string columns. Done per
+# channel to keep the number of temporary strings low.
+def _extend_texts(columns, rows):
+    if not rows:
+        return
+    values = list(zip(*rows))
+    rows.clear()
+
+    # Descriptions use "|" for line breaks on the wire
+    values[2] = [None if value is None else value.replace("|", "\n") for value in values[2]]
+    for column, columnvalues in zip(columns, values):
+        column.extend(columnvalues)
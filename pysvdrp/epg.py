@@ -14,43 +14,133 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import time
+from bisect import bisect_left, bisect_right
 from collections import UserList
 from collections import UserDict
-from pysvdrp.channels import Channel
+from heapq import merge
+from itertools import chain, repeat
+from pysvdrp.channels import Channel, _dropindexes
 from pysvdrp.exceptions import SVDRPException, ActionNotTaken
+from pysvdrp.metrics import instrumented
 
-def list_epg(self, channel = '', filter = ''):
+@instrumented
+def list_epg(self, channel = '', filter = '', index = None, lazy: bool = False, deadline: float = None):
     """
     Gets EPG data. The EPG data is returned as "Schedules" object
 
     channel: Optional channel to get EPG for (EPG for all channels if not given)
              May be one of "channel number", "channel id" and "Channel object"
     filter: [ now | next | at <Time> ]
+    index: Optional "SearchIndex" to add the received events to
+    lazy: If "True" the events are "LazyEvent" objects which only decode
+          their text fields when they are used
+    deadline: Optional time limit in seconds for the whole command. See
+              "SVDRPConnection.deadline".
     """
+    schedules = Schedules()
+    for channelid, schedule in self.iter_epg(channel, filter, index, lazy, deadline):
+        schedules[channelid] = schedule
+    return schedules
 
-    # If "Channel" object is given, get the channel id
-    if isinstance(channel, Channel):
-        channel = channel.channelid
 
-    cmd = ["LSTE"]
-    if channel:
-        cmd.append(str(channel))
-    if filter:
-        cmd.append(filter)
-    self._send(" ".join(cmd))
+@instrumented
+def iter_epg(self, channel = '', filter = '', index = None, lazy: bool = False, deadline: float = None, known = None):
+    """
+    Gets EPG data as a stream. Yields a (channelid, Schedule) tuple for each
+    channel as soon as it is completely received from VDR. Only the schedule
+    that is currently parsed is held in memory, so this is the better choice
+    for processing full guide dumps.
 
-    schedules = Schedules()
+    The connection can't be used for other commands until the generator is
+    exhausted or closed. Closing it early reads the rest of the reply.
+    Other commands sent before that reconnect and drop the reply.
 
+    channel: Optional channel to get EPG for (EPG for all channels if not given)
+             May be one of "channel number", "channel id" and "Channel object"
+    filter: [ now | next | at <Time> ]
+    index: Optional "SearchIndex" to add the received events to
+    lazy: If "True" the events are "LazyEvent" objects which only decode
+          their text fields when they are used
+    deadline: Optional time limit in seconds for the whole command,
+              including the time the caller spends between the yielded
+              schedules. See "SVDRPConnection.deadline".
+    known: Optional mapping of channel ids to dicts of "E" lines and
+           already known events. Events whose "E" line is found there are
+           not parsed again, the known object is used instead.
+    """
+    limit = self.deadline(deadline)
+    with limit:
+        self._send(_lste_command(channel, filter))
+
+    # The final "End of EPG data" line is not yielded by "_recviter". The
+    # deadline only applies while the generator runs, so other commands
+    # aren't limited by it while it is paused or after it was abandoned.
+    lines = self._recviter()
+    schedules = _read_schedules(lines, index, lazy, known)
     try:
-        status, data = self._recvlist()
-        data.pop() # Remove "End of EPG data"
-        schedules.read(iter(data))
-    except ActionNotTaken:
-        pass # Just ignore "No schedule found" error
-
+        while True:
+            with limit:
+                try:
+                    result = next(schedules)
+                except (StopIteration, ActionNotTaken):
+                    return # Just ignore "No schedule found" error
+            yield result
+    finally:
+        # Keep the connection usable if we stopped in the middle of the
+        # reply. If this fails, then the next command reconnects.
+        try:
+            with limit:
+                for line in lines:
+                    pass
+        except OSError:
+            pass
+
+
+@instrumented
+def fetch_epg_parallel(self, channels = None, workers: int = 4, processes: bool = False):
+    """
+    Gets EPG data for many channels over several SVDRP connections at once.
+    The channels are distributed over "workers" new connections to the same
+    VDR. Each worker fetches and parses the EPG data of its channels one by
+    one. The results are merged into one "Schedules" object which keeps the
+    order of "channels".
+
+    Make sure your VDR accepts enough SVDRP clients at the same time. The
+    traffic of the worker connections is not included in the metrics.
+
+    channels: Channels to get EPG for. Each one may be one of "channel
+              number", "channel id" and "Channel object". By default all
+              channels from "list_channels" are used.
+    workers: Number of connections to use
+    processes: If True, the workers run in separate processes, so parsing
+               isn't limited to one CPU core. Threads are used otherwise.
+    """
+    if workers < 1:
+        raise ValueError("At least one worker is needed")
+
+    if channels is None:
+        channels = self.list_channels()
+    channels = [channel.channelid if isinstance(channel, Channel) else channel for channel in channels]
+
+    slices = [channels[index::workers] for index in range(workers)]
+    slices = [channelslice for channelslice in slices if channelslice]
+    # Imported here as "concurrent.futures" pulls in "multiprocessing"
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=max(len(slices), 1)) as pool:
+        results = list(pool.map(_fetch_epg_worker, repeat(self.host), repeat(self.port), slices))
+
+    # Channel number "index" was handled by worker "index % workers"
+    schedules = Schedules()
+    for index in range(len(channels)):
+        result = results[index % workers][index // workers]
+        if result is not None:
+            schedules[result[0]] = result[1]
     return schedules
 
 
+@instrumented
 def clear_epg(self, channel = ""):
     """
     Clears epg data
@@ -61,14 +151,7 @@ def clear_epg(self, channel = ""):
     Returns True if there was EPG data to clear. False otherwise.
     """
 
-    # If "Channel" object is given, get the channel id
-    if isinstance(channel, Channel):
-        channel = channel.channelid
-
-    cmd = ["CLRE"]
-    if channel:
-        cmd.append(str(channel))
-    self._send(" ".join(cmd))
+    self._send(_clre_command(channel))
 
     # Catch the ActionNotTaken exception raised if no EPG data exists
     try:
@@ -76,66 +159,341 @@ def clear_epg(self, channel = ""):
     except ActionNotTaken:
         return False
 
-    if status != 250:
-        raise SVDRPException(message, status)
+    return _parse_clre(status, message)
 
-    return True
 
+@instrumented
+def put_epg(self, data, maxevents: int = 0):
+    """
+    Sends EPG data to VDR
 
-def put_epg(self, data):
-    self._send("PUTE")
-    status, message = self._recvmsg()
-    if status != 354:
-        raise SVDRPException(message, status)
+    data: EPG data as "Schedules", "Schedule" or "Event" object or as string
+    maxevents: Optional limit for the number of events sent in one PUTE
+               transaction. Only used if "data" is a "Schedules" object.
+               If a transaction fails, then the remaining ones are still
+               sent and the first error is raised afterwards.
+    """
+    errors = []
+    for lines in _pute_transactions(data, maxevents):
+        self._send("PUTE")
+        status, message = self._recvmsg()
+        if status != 354:
+            raise SVDRPException(message, status)
+
+        self._sendlines(chain(lines, (".",)))
+
+        try:
+            status, message = self._recvmsg()
+            if status != 250:
+                raise SVDRPException(message, status)
+        except SVDRPException as e:
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+
+# Worker for "fetch_epg_parallel". Fetches the EPG data of the given channels
+# over an own connection. Returns a (channelid, Schedule) tuple or None for
+# each channel.
+def _fetch_epg_worker(host, port, channels):
+    from pysvdrp import SVDRPConnection
+
+    connection = SVDRPConnection(host, port)
+    try:
+        result = []
+        for channel in channels:
+            schedules = list(connection.iter_epg(channel))
+            result.append(schedules[0] if schedules else None)
+        return result
+    finally:
+        connection.close()
+
+
+# Helpers shared by the blocking and the asyncio connection. They build the
+# command strings and parse the replies.
+def _lste_command(channel, filter):
+    # If "Channel" object is given, get the channel id
+    if isinstance(channel, Channel):
+        channel = channel.channelid
+
+    cmd = ["LSTE"]
+    if channel:
+        cmd.append(str(channel))
+    if filter:
+        cmd.append(filter)
+    return " ".join(cmd)
 
-    for line in str(data).split("\n"):
-        if line.strip() != "":
-            self._send(line)
-    self._send(".")
+def _clre_command(channel):
+    # If "Channel" object is given, get the channel id
+    if isinstance(channel, Channel):
+        channel = channel.channelid
 
-    status, message = self._recvmsg()
+    cmd = ["CLRE"]
+    if channel:
+        cmd.append(str(channel))
+    return " ".join(cmd)
+
+def _parse_clre(status, message):
     if status != 250:
         raise SVDRPException(message, status)
 
+    return True
+
+# Parses LSTE reply lines. Yields a (channelid, Schedule) tuple for each
+# channel block.
+def _read_schedules(iterator: iter, index = None, lazy = False, known = None):
+    for line in iterator:
+        if line[0] == "C":
+            schedule = Schedule()
+            channelid, schedule.channelname = line.split(" ", 2)[1:]
+            schedule.channelid = channelid
+            schedule.read(iterator, lazy, known.get(channelid) if known is not None else None)
+            if index is not None:
+                index.add_schedule(channelid, schedule)
+            yield channelid, schedule
+        elif line[0] == "c":
+            pass
+        else:
+            raise ValueError("Unknown tag while parsing EPG Schedules: " + line[0])
+
+# Returns the lines to send for PUTE
+def _pute_lines(data):
+    if isinstance(data, _EPGData):
+        return data.iter_lines()
+    return [line for line in str(data).split("\n") if line.strip() != ""]
+
+# Splits the data into lists of lines. Each list is sent in one PUTE
+# transaction. Channels are split up if they have more than "maxevents"
+# events.
+def _pute_transactions(data, maxevents):
+    if not maxevents or not isinstance(data, Schedules):
+        yield _pute_lines(data)
+        return
+
+    # The "C" line is only added with the first event of a block, so no
+    # empty blocks are sent
+    lines = []
+    count = 0
+    for channelid, schedule in data.items():
+        header = None
+        for event in schedule:
+            if count == maxevents:
+                if header is not None:
+                    lines.append("c")
+                yield lines
+                lines = []
+                header = None
+                count = 0
+            if header is None:
+                header = " ".join(["C", channelid, schedule.channelname])
+                lines.append(header)
+            lines.append(_event_header(event))
+            lines.extend(event.iter_lines())
+            lines.append("e")
+            count += 1
+        if header is not None:
+            lines.append("c")
+
+    if count:
+        yield lines
+
+# Returns the "E" line for an event
+def _event_header(event):
+    return "E {} {} {} {:X} {:X}".format(event.eventid, event.starttime, event.duration, event.tableid, event.version)
+
+
+# Serialization shared by "Schedules", "Schedule" and "Event". The classes
+# provide "iter_lines" which yields the EPG data line by line (as used by
+# PUTE) without line endings.
+class _EPGData:
+    __slots__ = ()
+
+    def write_to(self, fp):
+        """
+        Writes the EPG data to the file-like object "fp" line by line
+        """
+        for line in self.iter_lines():
+            fp.write(line + "\n")
+
+    def __str__(self):
+        return "".join([line + "\n" for line in self.iter_lines()])
+
 
-class Schedules(UserDict):
+class Schedules(_EPGData, UserDict):
     def __setitem__(self, key, value):
         UserDict.__setitem__(self, key, value)
         value.channelid = key
 
-    def read(self, iterator: iter):
-        for line in iterator:
-            if line[0] == "C":
-                schedule = Schedule()
-                channelid, schedule.channelname = line.split(" ", 2)[1:]
-                self[channelid] = schedule
-                schedule.read(iterator)
-            elif line[0] == "c":
-                pass
-            else:
-                raise ValueError("Unknown tag while parsing EPG Schedules: " + line[0])
-
-    def __str__(self):
-        result = ""
+    def read(self, iterator: iter, index = None, lazy: bool = False):
+        for channelid, schedule in _read_schedules(iterator, index, lazy):
+            self[channelid] = schedule
+
+    def save(self, path: str):
+        """
+        Saves the EPG data to a compact binary snapshot file
+        """
+        from pysvdrp import snapshot
+        snapshot.save(self, path)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Loads EPG data from a snapshot file written by "save". The file is
+        memory mapped and the events of a channel are only created when its
+        schedule is used for the first time.
+        """
+        from pysvdrp import snapshot
+        return snapshot.load(path)
+
+    def at(self, when: int):
+        """
+        Returns a list of (channelid, Event) tuples with the event running at
+        "when" (seconds since epoch) on each channel. Gives the same events
+        as "LSTE at <when>" without asking VDR.
+        """
+        result = []
         for channelid, schedule in self.items():
-            result += " ".join(["C", channelid, schedule.channelname]) + "\n"
-            result += str(schedule)
-            result += "c\n"
+            event = schedule.at(when)
+            if event is not None:
+                result.append((channelid, event))
         return result
 
+    def between(self, start: int, end: int):
+        """
+        Returns an iterator over (channelid, Event) tuples of all events
+        overlapping the time window from "start" to "end" (seconds since
+        epoch) on all channels, ordered by start time.
+        """
+        return merge(*[zip(repeat(channelid), schedule.between(start, end))
+                       for channelid, schedule in self.items()],
+                     key=_starttime_of_item)
+
+    def iter_lines(self):
+        for channelid, schedule in self.items():
+            yield " ".join(["C", channelid, schedule.channelname])
+            yield from schedule.iter_lines()
+            yield "c"
+
+
+# List of events of one channel. Time based lookups use an index of start
+# times which is built on first use and dropped when the list changes.
+# Appending events in start time order keeps the index. If an event is
+# modified in place, call "reindex()".
+class Schedule(_EPGData, UserList):
+    _indexes = None
 
-class Schedule(UserList):
     def __init__(self, initlist=None):
         UserList.__init__(self, initlist)
         self.channelname = ""
 
-    def read(self, iterator: iter):
+    def append(self, item):
+        indexes = self._indexes
+        if indexes is not None:
+            starts, order, maxduration = indexes
+            if not starts or item.starttime >= starts[-1]:
+                starts.append(item.starttime)
+                order.append(len(self.data))
+                self._indexes = (starts, order, max(maxduration, item.duration))
+            else:
+                self._indexes = None
+        self.data.append(item)
+
+    def at(self, when: int):
+        """
+        Returns the event running at "when" (seconds since epoch) or None.
+        Like VDR this is the latest starting event which did not end before
+        "when".
+        """
+        position = self._around(when)
+        if position < 0:
+            return None
+        return self.data[self._indexes[1][position]]
+
+    def between(self, start: int, end: int):
+        """
+        Returns a list of the events overlapping the time window from "start"
+        to "end" (seconds since epoch), ordered by start time
+        """
+        starts, order, maxduration = self._getindexes()
+        data = self.data
+        result = []
+        for position in range(bisect_left(starts, start - maxduration), bisect_left(starts, end)):
+            event = data[order[position]]
+            if event.starttime + event.duration > start:
+                result.append(event)
+        return result
+
+    def now(self, when: int = None):
+        """
+        Returns the present event at "when" (default: now) or None. Like
+        VDR's "LSTE now" this is the latest event which started at or
+        before "when", even if it already ended. Use "at" to only get an
+        event which is still running.
+        """
+        if when is None:
+            when = int(time.time())
+        position = bisect_right(self._getindexes()[0], when) - 1
+        if position < 0:
+            return None
+        return self.data[self._indexes[1][position]]
+
+    def next(self, when: int = None):
+        """
+        Returns the event following the present one (see "now") or None.
+        Gives the same event as "LSTE next". If no event started before
+        "when" (default: now), then there is no following event either.
+        """
+        if when is None:
+            when = int(time.time())
+        starts, order, maxduration = self._getindexes()
+        position = bisect_right(starts, when)
+        if 0 < position < len(order):
+            return self.data[order[position]]
+        return None
+
+    def reindex(self):
+        self._indexes = None
+
+    # Returns the index position of the event running at "when" or -1. Of
+    # events with the same start time the first one wins, like in VDR.
+    def _around(self, when):
+        starts, order, maxduration = self._getindexes()
+        data = self.data
+        found = -1
+        position = bisect_right(starts, when) - 1
+        while position >= 0 and starts[position] >= when - maxduration:
+            if found >= 0 and starts[position] != starts[found]:
+                break
+            event = data[order[position]]
+            if event.starttime + event.duration >= when:
+                found = position
+            position -= 1
+        return found
+
+    # Returns the (start times, event positions, longest duration) index.
+    # Events with equal start times keep their order.
+    def _getindexes(self):
+        if self._indexes is None:
+            data = self.data
+            order = sorted(range(len(data)), key=lambda position: data[position].starttime)
+            starts = [data[position].starttime for position in order]
+            maxduration = max((event.duration for event in data), default=0)
+            self._indexes = (starts, order, maxduration)
+        return self._indexes
+
+    # known: Optional dict of "E" lines and events to use instead of parsing
+    def read(self, iterator: iter, lazy: bool = False, known = None):
+        if lazy:
+            return self._readlazy(iterator, known)
         for line in iterator:
             if line[0] == "E":
-                event = Event()
-                event.eventid, event.starttime, event.duration, event.tableid, event.version = line.split(" ")[1:]
+                event = known.get(line) if known else None
+                if event is None:
+                    event = _read_event(line, iterator)
+                else:
+                    _skip_event(iterator)
                 self.append(event)
-                event.read(iterator)
             elif line[0] == "e":
                 pass
             elif line[0] == "c":
@@ -143,19 +501,92 @@ class Schedule(UserList):
             else:
                 raise ValueError("Unknown tag while parsing EPG Schedules: " + line[0])
 
-    def __str__(self):
-        result = ""
-        for event in self:
-            result += " ".join(map(str, ["E", event.eventid, event.starttime, event.duration, event.tableid, event.version])) + "\n"
-            result += str(event)
-            result += "e\n"
-        return result
+    # Like "read" but creates "LazyEvent" objects. Only the "E" line is
+    # parsed, the other lines of an event are stored as they are.
+    def _readlazy(self, iterator, known = None):
+        append = self.append
+        new = LazyEvent.__new__
+        for line in iterator:
+            tag = line[0]
+            if tag == "E":
+                event = known.get(line) if known else None
+                if event is not None:
+                    _skip_event(iterator)
+                    append(event)
+                    continue
+                event = new(LazyEvent)
+                eventid, starttime, duration, tableid, version = line.split(" ")[1:]
+                event._eventid = int(eventid)
+                event._starttime = int(starttime)
+                event._duration = int(duration)
+                event._tableid = int(tableid, 16)
+                event._version = int(version, 16)
+                lines = []
+                for line in iterator:
+                    if line[0] == "e":
+                        break
+                    if line[0] not in _EVENT_TAGS:
+                        raise ValueError("Unknown tag while parsing EPG: " + line[0])
+                    lines.append(line)
+                event._raw = "\n".join(lines)
+                append(event)
+            elif tag == "c":
+                return
+            elif tag != "e":
+                raise ValueError("Unknown tag while parsing EPG Schedules: " + tag)
 
+    def iter_lines(self):
+        for event in self:
+            yield _event_header(event)
+            yield from event.iter_lines()
+            yield "e"
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__",
+              "insert", "pop", "remove", "clear", "extend", "reverse", "sort"):
+    setattr(Schedule, _name, _dropindexes(_name))
+
+def _starttime_of_item(item):
+    return item[1].starttime
+
+# Skips the lines of an event up to its "e" line
+def _skip_event(iterator):
+    for line in iterator:
+        if line[0] == "e":
+            return
+
+# Creates an "Event" from an "E" line and reads the following lines of the
+# event from "iterator"
+def _read_event(line, iterator):
+    event = Event()
+    eventid, starttime, duration, tableid, version = line.split(" ")[1:]
+    event._eventid = int(eventid)
+    event._starttime = int(starttime)
+    event._duration = int(duration)
+    event._tableid = int(tableid, 16)
+    event._version = int(version, 16)
+    event.read(iterator)
+    return event
+
+
+class Event(_EPGData):
+    __slots__ = ("_eventid", "_starttime", "_duration", "_tableid", "_version",
+                 "title", "shorttext", "description", "contents",
+                 "parentalrating", "components", "vps", "aux")
 
-class Event:
     def __init__(self):
-        self.tableid = 0
-        self.version = 0
+        self._eventid = None
+        self._starttime = 0
+        self._duration = 0
+        self._tableid = 0
+        self._version = 0
+        self.title = None
+        self.shorttext = None
+        self.description = None
+        self.contents = None
+        self.parentalrating = None
+        self.components = None
+        self.vps = None
+        self.aux = None
 
     def read(self, iterator: iter):
         for line in iterator:
@@ -170,7 +601,7 @@ class Event:
             elif line[0] == "R":
                 self.parentalrating = line[2:]
             elif line[0] == "X":
-                if not hasattr(self, "components"):
+                if self.components is None:
                     self.components = []
                 self.components.append(line[2:])
             elif line[0] == "V":
@@ -192,8 +623,8 @@ class Event:
 
         # We do automagic event id generation here if not already set
         # taken from xmltv2vdr.pl
-        if not hasattr(self, "eventid"):
-            self.eventid = int(value / 60 % 0xFFFF)
+        if self._eventid is None:
+            self._eventid = int(self._starttime / 60 % 0xFFFF)
 
     @property
     def duration(self):
@@ -203,23 +634,121 @@ class Event:
     def duration(self, value):
         self._duration = int(value)
 
-    def __str__(self):
-        result = ""
-        if hasattr(self, "title"):
-            result += "T " + self.title.replace("\n", " ") + "\n"
-        if hasattr(self, "shorttext"):
-            result += "S " + self.shorttext.replace("\n", " ") + "\n"
-        if hasattr(self, "description"):
-            result += "D " + self.description.replace("\n", "|") + "\n"
-        if hasattr(self, "contents"):
-            result += "G " + " ".join(self.contents) + "\n"
-        if hasattr(self, "parentalrating"):
-            result += "R " + self.parentalrating + "\n"
-        if hasattr(self, "components"):
+    # Event id, table id and version are stored as numbers. Strings (table id
+    # and version in hex, as in "E" lines) are accepted, too.
+    @property
+    def eventid(self):
+        return self._eventid
+
+    @eventid.setter
+    def eventid(self, value):
+        self._eventid = None if value is None else int(value)
+
+    @property
+    def tableid(self):
+        return self._tableid
+
+    @tableid.setter
+    def tableid(self, value):
+        self._tableid = int(value, 16) if isinstance(value, str) else int(value)
+
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, value):
+        self._version = int(value, 16) if isinstance(value, str) else int(value)
+
+    def iter_lines(self):
+        if self.title is not None:
+            yield "T " + self.title.replace("\n", " ")
+        if self.shorttext is not None:
+            yield "S " + self.shorttext.replace("\n", " ")
+        if self.description is not None:
+            yield "D " + self.description.replace("\n", "|")
+        if self.contents is not None:
+            yield "G " + " ".join(self.contents)
+        if self.parentalrating is not None:
+            yield "R " + self.parentalrating
+        if self.components is not None:
             for component in self.components:
-                result += "X " + component + "\n"
-        if hasattr(self, "vps"):
-            result += "V " + self.vps + "\n"
-        if hasattr(self, "aux"):
-            result += "@ " + self.aux + "\n"
-        return result
+                yield "X " + component
+        if self.vps is not None:
+            yield "V " + self.vps
+        if self.aux is not None:
+            yield "@ " + self.aux
+
+
+# Event which keeps its raw EPG lines and only decodes a field when it is
+# accessed for the first time. Used by "Schedule.read" in lazy mode. The
+# values are the same an "Event" would have, so the serialized output is
+# identical. The lines are kept as one string which needs far less memory
+# than a list of lines.
+class LazyEvent(Event):
+    __slots__ = ("_raw",)
+
+    def __init__(self):
+        self._eventid = None
+        self._starttime = 0
+        self._duration = 0
+        self._tableid = 0
+        self._version = 0
+        self._raw = ""
+
+    def read(self, iterator: iter):
+        lines = []
+        for line in iterator:
+            if line[0] == "e":
+                break
+            if line[0] not in _EVENT_TAGS:
+                raise ValueError("Unknown tag while parsing EPG: " + line[0])
+            lines.append(line)
+        self._raw = "\n".join(lines)
+
+_EVENT_TAGS = "TSDGRXV@"
+
+# Returns a function which returns the value of the last line with the
+# given tag or None
+def _decode_tag(tag, convert = None):
+    def decode(raw):
+        value = None
+        if raw:
+            for line in raw.split("\n"):
+                if line[0] == tag:
+                    value = line[2:]
+        if value is not None and convert is not None:
+            value = convert(value)
+        return value
+    return decode
+
+def _decode_components(raw):
+    if not raw:
+        return None
+    components = [line[2:] for line in raw.split("\n") if line[0] == "X"]
+    return components or None
+
+# Property which reads a slot of "Event" and fills it from the raw lines
+# if it was not set, yet
+def _lazyfield(name, decode):
+    slot = getattr(Event, name)
+    def getter(self):
+        try:
+            return slot.__get__(self, LazyEvent)
+        except AttributeError:
+            value = decode(self._raw)
+            slot.__set__(self, value)
+            return value
+    def setter(self, value):
+        slot.__set__(self, value)
+    return property(getter, setter)
+
+for _name, _decode in (("title", _decode_tag("T")),
+                       ("shorttext", _decode_tag("S")),
+                       ("description", _decode_tag("D", lambda value: value.replace("|", "\n"))),
+                       ("contents", _decode_tag("G", lambda value: value.split(" "))),
+                       ("parentalrating", _decode_tag("R")),
+                       ("components", _decode_components),
+                       ("vps", _decode_tag("V")),
+                       ("aux", _decode_tag("@"))):
+    setattr(LazyEvent, _name, _lazyfield(_name, _decode))
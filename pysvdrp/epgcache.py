@@ -0,0 +1,224 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp.channels import Channel
+from pysvdrp.epg import Schedules, Schedule, _event_header
+
+# Changes found by "EPGCache.refresh". Each list contains (channelid, Event)
+# tuples. For removed events the last known "Event" object is given.
+class EPGDelta:
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+# Keeps the last known EPG data of a VDR and refreshes it incrementally.
+# Events are identified by channel id and event id. An event counts as
+# changed if its table id, version, start time or duration differ.
+#
+# Unchanged events keep their "Event" object, so consumers may hold
+# references to them between refreshes. They are recognized by their "E"
+# line and are not parsed again.
+class EPGCache:
+    def __init__(self, connection, index = None) -> None:
+        """
+        Creates an empty cache
+
+        connection: "SVDRPConnection" to fetch EPG data with
+        index: Optional "SearchIndex" which is kept up to date with the
+               cached events
+        """
+        self.connection = connection
+        self.index = index
+        self.schedules = Schedules()
+        self._events = {}
+        self._headers = {}
+
+    def save(self, path: str):
+        """
+        Saves the cached EPG data to a snapshot file
+        """
+        self.schedules.save(path)
+
+    def load(self, path: str):
+        """
+        Replaces the cached EPG data with the content of a snapshot file.
+        Call "refresh" afterwards to get the changes since the snapshot.
+        """
+        self.schedules = Schedules.load(path)
+        self._events = {}
+        self._headers = {}
+        if self.index is not None:
+            self.index.clear()
+            for channelid, schedule in self.schedules.items():
+                self.index.add_schedule(channelid, schedule)
+
+    def refresh(self, channel = '', filter = ''):
+        """
+        Fetches EPG data from VDR, updates the cache and returns the changes
+        as "EPGDelta" object.
+
+        channel: Optional channel to refresh (all channels if not given)
+                 May be one of "channel number", "channel id" and
+                 "Channel object". Removed schedules are only detected for
+                 channel ids and "Channel" objects.
+        filter: [ now | next | at <Time> ]. With a filter only a time window
+                is fetched. Events are added and updated then, but never
+                removed.
+        """
+        delta = EPGDelta()
+        seen = set()
+        known = _KnownEvents(self)
+        for channelid, schedule in self.connection.iter_epg(channel, filter, known=known):
+            seen.add(channelid)
+            if filter:
+                self._merge(channelid, schedule, delta)
+            else:
+                self._replace(channelid, schedule, delta)
+
+        if filter:
+            return delta
+
+        # Schedules VDR did not send anymore
+        if not channel:
+            gone = [channelid for channelid in self.schedules if channelid not in seen]
+        else:
+            if isinstance(channel, Channel):
+                channel = channel.channelid
+            gone = [channel] if channel in self.schedules and channel not in seen else []
+        for channelid in gone:
+            for event in self.schedules[channelid]:
+                delta.removed.append((channelid, event))
+                self._unindex(event)
+            del self.schedules[channelid]
+            self._events.pop(channelid, None)
+            self._headers.pop(channelid, None)
+
+        return delta
+
+    # Replaces the cached schedule of a channel with a freshly fetched one.
+    # Unchanged events are the cached objects already.
+    def _replace(self, channelid, schedule, delta):
+        old = dict(self._eventsof(channelid))
+        headers = dict(self._headersof(channelid))
+        events = {}
+        for index, event in enumerate(schedule):
+            previous = old.pop(event.eventid, None)
+            if previous is event:
+                pass
+            elif previous is None:
+                delta.added.append((channelid, event))
+                self._reindex(channelid, None, event)
+                headers[_event_header(event)] = event
+            elif _version(previous) != _version(event):
+                delta.changed.append((channelid, event))
+                self._reindex(channelid, previous, event)
+                headers.pop(_event_header(previous), None)
+                headers[_event_header(event)] = event
+            else:
+                schedule[index] = event = previous
+            events[event.eventid] = event
+
+        for event in old.values():
+            delta.removed.append((channelid, event))
+            self._unindex(event)
+            headers.pop(_event_header(event), None)
+
+        self.schedules[channelid] = schedule
+        self._events[channelid] = events
+        self._headers[channelid] = headers
+
+    # Merges the events of a partial schedule into the cached one
+    def _merge(self, channelid, schedule, delta):
+        if channelid not in self.schedules:
+            self.schedules[channelid] = Schedule()
+        cached = self.schedules[channelid]
+        cached.channelname = schedule.channelname
+        events = self._eventsof(channelid)
+        headers = self._headersof(channelid)
+
+        for event in schedule:
+            previous = events.get(event.eventid)
+            if previous is event:
+                continue
+            if previous is None:
+                delta.added.append((channelid, event))
+                self._reindex(channelid, None, event)
+                index = 0
+                while index < len(cached) and cached[index].starttime <= event.starttime:
+                    index += 1
+                cached.insert(index, event)
+            elif _version(previous) != _version(event):
+                delta.changed.append((channelid, event))
+                self._reindex(channelid, previous, event)
+                cached[cached.index(previous)] = event
+                headers.pop(_event_header(previous), None)
+            else:
+                continue
+            events[event.eventid] = event
+            headers[_event_header(event)] = event
+
+    # Returns the event id index of a cached schedule. For schedules loaded
+    # from a snapshot it is built on first use.
+    def _eventsof(self, channelid):
+        events = self._events.get(channelid)
+        if events is None:
+            events = {}
+            if channelid in self.schedules:
+                for event in self.schedules[channelid]:
+                    events[event.eventid] = event
+            self._events[channelid] = events
+        return events
+
+    # Returns the "E" line index of a cached schedule. Built on first use.
+    def _headersof(self, channelid):
+        headers = self._headers.get(channelid)
+        if headers is None:
+            headers = {}
+            if channelid in self.schedules:
+                for event in self.schedules[channelid]:
+                    headers[_event_header(event)] = event
+            self._headers[channelid] = headers
+        return headers
+
+    # Keeps the search index up to date
+    def _reindex(self, channelid, previous, event):
+        if self.index is not None:
+            if previous is not None:
+                self.index.remove(previous)
+            self.index.add(channelid, event)
+
+    def _unindex(self, event):
+        if self.index is not None:
+            self.index.remove(event)
+
+
+# Gives "iter_epg" the known events of a channel by their "E" line
+class _KnownEvents:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, channelid):
+        return self.cache._headersof(channelid)
+
+
+# Returns what is compared to detect changed events
+def _version(event):
+    return (event.tableid, event.version, event.starttime, event.duration)
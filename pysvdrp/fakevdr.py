@@ -0,0 +1,531 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# In-process stand-in for a VDR SVDRP server. Meant for testing and
+# benchmarking without a real VDR:
+#
+#   with FakeVDR(channels=3000, events=200000) as vdr:
+#       conn = SVDRPConnection(vdr.host, vdr.port)
+#       schedules = conn.list_epg()
+#
+# It answers LSTC, LSTE, PUTE, NEWC, MODC, MOVC, DELC, CLRE, PLUG, STAT and
+# QUIT from
+# synthetic data or from recorded LSTC/LSTE reply lines.
+
+import re
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from pysvdrp.channels import Channel
+
+# Valid channel ids (source-nid-tid-sid or source-nid-tid-sid-rid)
+_CHANNELID = re.compile(r"[A-Z][^-]*-\d+-\d+-\d+(-\d+)?$")
+
+# Time used for the greeting and as base for synthetic events
+GREETING_TIME = "Sun Dec 27 17:15:23 2020"
+SYNTHETIC_START = 1609085723
+
+
+def synthetic_channels(count: int):
+    """
+    Returns "count" synthetic channel strings (LSTC format without number)
+    """
+    return [
+        "Channel {},Ch{};Provider:{}:HC34M2S0:S19.2E:27500:{}=2:{}=deu@3,{}=eng@3:{}:0:{}:1:{}:0".format(
+            number, number, 10714 + number % 100, 101 + number, 102 + number,
+            103 + number, 104 + number, 28000 + number, 1000 + number // 10)
+        for number in range(count)
+    ]
+
+
+def synthetic_epg(channelids, events: int, start: int = SYNTHETIC_START):
+    """
+    Returns LSTE reply lines (without status codes and without the final
+    "End of EPG data" line) with "events" events spread over the given
+    channel ids.
+    """
+    lines = []
+    perchannel, remainder = divmod(events, max(len(channelids), 1))
+    for index, channelid in enumerate(channelids):
+        count = perchannel + (1 if index < remainder else 0)
+        if not count:
+            continue
+        lines.append("C {} Channel {}".format(channelid, index))
+        for number in range(count):
+            lines += [
+                "E {} {} 1800 4E 1".format(number + 1, start + number * 1800),
+                "T Title of event {}".format(number),
+                "S Short text",
+                "D Live-Übertragung vom Fußball|with a second line",
+                "G 12 20",
+                "X 2 03 deu stereo",
+                "V {}".format(start + number * 1800),
+                "e"
+            ]
+        lines.append("c")
+    return lines
+
+
+class FakeVDR:
+    def __init__(self, channels: int = 100, events: int = 1000,
+                 channellines = None, epglines = None,
+                 latency: float = 0, bandwidth: int = 0, badcharset: int = 0,
+                 idletimeout: float = 0, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        Creates a fake VDR. The server runs in a background thread between
+        "start()" and "stop()" or while used as context manager.
+
+        channels: Number of synthetic channels
+        events: Number of synthetic events, spread over all channels
+        channellines: Recorded LSTC lines ("<number> <channel>") to use
+                      instead of synthetic channels
+        epglines: Recorded LSTE lines to use instead of synthetic events
+        latency: Delay in seconds before every reply
+        bandwidth: Limits the reply speed to this many bytes per second
+        badcharset: Sends every n-th line of LSTE replies in ISO-8859-1
+                    instead of UTF-8, like broken DVB data
+        idletimeout: Closes connections which were idle for this many
+                     seconds, like VDR's "SVDRPTimeout"
+        host: Address to listen on
+        port: Port to listen on (default: any free port)
+        """
+        if channellines is not None:
+            channellines = [line.split(" ", 1)[1] for line in channellines]
+        else:
+            channellines = synthetic_channels(channels)
+        self.channels = [Channel(line, 0) for line in channellines]
+
+        channelids = [channel.channelid for channel in self.channels if not channel.groupsep]
+        if epglines is None:
+            epglines = synthetic_epg(channelids, events)
+        self.schedules = OrderedDict()
+        self._replycache = {}
+        self._storeepg(epglines)
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.badcharset = badcharset
+        self.idletimeout = idletimeout
+        self.commands = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler, bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.fakevdr = self
+        self._server.server_bind()
+        self._server.server_activate()
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # Stores LSTE/PUTE lines. Events with an already known event id replace
+    # the known ones.
+    def _storeepg(self, lines):
+        self._replycache.clear()
+        events = None
+        event = None
+        for line in lines:
+            if line[0] == "C":
+                channelid, channelname = (line.split(" ", 2)[1:] + [""])[:2]
+                events = self.schedules.setdefault(channelid, [channelname, OrderedDict()])[1]
+            elif line[0] == "E":
+                event = [line]
+                events[int(line.split(" ")[1])] = event
+            elif line[0] == "e":
+                event = None
+            elif line[0] == "c":
+                pass
+            elif event is not None:
+                event.append(line)
+
+    # Returns the reply lines for LSTE
+    def _lste(self, args):
+        channelid = None
+        if args and args[0] not in ("now", "next", "at"):
+            channelid = args.pop(0)
+            if channelid.isdigit():
+                channel = self._channelbynumber(int(channelid))
+                channelid = channel.channelid if channel else None
+            if channelid not in self.schedules:
+                return None
+
+        now = time.time()
+        mode = args[0] if args else None
+        if mode == "at":
+            now = int(args[1])
+
+        lines = []
+        for cid, (name, events) in self.schedules.items():
+            if channelid and cid != channelid:
+                continue
+            selected = list(events.values())
+            if mode == "at":
+                selected = _around(selected, now)
+            elif mode in ("now", "next"):
+                selected = _present(selected, now, mode == "next")
+            if mode and not selected:
+                continue
+            lines.append("C {} {}".format(cid, name))
+            for event in selected:
+                lines += event
+                lines.append("e")
+            lines.append("c")
+        return lines
+
+    # Returns the channel numbers like VDR's cChannels::ReNumber as dict of
+    # "id(channel)" and number. Group separators with a number
+    # (":@<number> name") make the numbering continue at that number if it
+    # is higher.
+    def _numbers(self):
+        numbers = {}
+        number = 1
+        for channel in self.channels:
+            if channel.groupsep:
+                number = max(number, _groupstart(channel))
+            else:
+                numbers[id(channel)] = number
+                number += 1
+        return numbers
+
+    def _channelbynumber(self, number):
+        numbers = self._numbers()
+        for channel in self.channels:
+            if numbers.get(id(channel)) == number:
+                return channel
+        return None
+
+    # Moves a channel like VDR's MOVC: cListBase::Move places a channel,
+    # moved downwards, behind the target and a channel, moved upwards, in
+    # front of it. If the target is the first channel of a group with a
+    # fixed start number, then VDR moves behind the group separator
+    # instead (cChannels::MoveNeedsDecrement), so the moved channel gets
+    # the target number. Returns the reply status and text.
+    def _movechannel(self, source, target):
+        numbers = self._numbers()
+        movefrom = self._channelbynumber(source)
+        if movefrom is None:
+            return 501, "Channel \"{}\" not defined".format(source)
+        moveto = self._channelbynumber(target)
+        if moveto is None:
+            return 501, "Channel \"{}\" not defined".format(target)
+        if numbers[id(movefrom)] == numbers[id(moveto)]:
+            return 501, "Can't move channel to same position"
+
+        channels = self.channels
+        downwards = channels.index(movefrom) < channels.index(moveto)
+        if downwards:
+            before = channels[channels.index(moveto) - 1]
+            if before.groupsep and _groupstart(before) == numbers[id(moveto)]:
+                moveto = before
+        if moveto is not movefrom:
+            channels.remove(movefrom)
+            position = channels.index(moveto)
+            channels.insert(position + 1 if downwards else position, movefrom)
+        return 250, "Channel \"{}\" moved to \"{}\"".format(source, target)
+
+
+# Returns the start number of a group separator or 0
+def _groupstart(channel):
+    text = str(channel)
+    if text.startswith(":@"):
+        number = text[2:].split(" ", 1)[0]
+        if number.isdigit():
+            return int(number)
+    return 0
+
+
+# Returns the event running at "when" as list like VDR's GetEventAround: the
+# latest starting event which did not end before "when"
+def _around(events, when):
+    found = []
+    delta = None
+    for event in events:
+        dt = when - _starts(event)
+        if dt >= 0 and (delta is None or dt < delta) and _starts(event) + _duration(event) >= when:
+            delta = dt
+            found = [event]
+    return found
+
+# Returns the present event at "when" as list like VDR's GetPresentEvent: the
+# last event in start time order which started at or before "when". With
+# "following" the event behind it is returned instead.
+def _present(events, when, following = False):
+    events = sorted(events, key=_starts)
+    found = -1
+    for position, event in enumerate(events):
+        if _starts(event) <= when:
+            found = position
+    if found < 0:
+        return []
+    if following:
+        found += 1
+    return events[found:found + 1]
+
+def _starts(event):
+    return int(event[0].split(" ")[2])
+
+def _duration(event):
+    return int(event[0].split(" ")[3])
+
+
+# Handles one SVDRP client
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            self.serve()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Client disconnected without "QUIT"
+
+    def serve(self):
+        vdr = self.server.fakevdr
+        self.reply(220, "fakevdr SVDRP VideoDiskRecorder 2.4.1; " + GREETING_TIME + "; UTF-8")
+        if vdr.idletimeout:
+            self.connection.settimeout(vdr.idletimeout)
+        while True:
+            try:
+                line = self.rfile.readline()
+            except socket.timeout:
+                self.reply(221, "fakevdr closing connection")
+                return
+            if not line:
+                return
+            line = line.decode("utf-8", errors="surrogateescape").rstrip("\r\n")
+            with vdr._lock:
+                vdr.commands.append(line)
+            args = line.split()
+            if not args:
+                continue
+            command = args.pop(0).upper()
+            # Unsplit arguments for commands which take a channel string
+            self.arguments = line.split(None, 1)[1] if args else ""
+            handler = getattr(self, "cmd_" + command, None)
+            if handler is None:
+                self.reply(500, "Command unrecognized: \"" + command + "\"")
+                continue
+            # The handlers lock "vdr._lock" only while they use the shared
+            # data. Replies are sent without holding it, so slow clients and
+            # the simulated latency don't block other clients.
+            if handler(vdr, args) is False:
+                return
+
+    # Sends one reply. Lines of a list reply are given as list.
+    def reply(self, status, lines, badcharset = 0):
+        self.send(self.encode(status, lines, badcharset))
+
+    # Encodes reply lines with status codes
+    def encode(self, status, lines, badcharset = 0):
+        if isinstance(lines, str):
+            lines = [lines]
+        data = []
+        last = len(lines) - 1
+        for index, line in enumerate(lines):
+            text = "{}{}{}\r\n".format(status, " " if index == last else "-", line)
+            if badcharset and index % badcharset == 0:
+                data.append(text.encode("iso-8859-1", errors="replace"))
+            else:
+                data.append(text.encode("utf-8", errors="surrogateescape"))
+        return b"".join(data)
+
+    # Sends encoded reply data, slowed down as configured
+    def send(self, data):
+        vdr = self.server.fakevdr
+        if vdr.latency:
+            time.sleep(vdr.latency)
+        # May be changed while we send
+        bandwidth = vdr.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        chunk = max(bandwidth // 20, 1)
+        for offset in range(0, len(data), chunk):
+            self.wfile.write(data[offset:offset + chunk])
+            time.sleep(chunk / bandwidth)
+
+    def cmd_QUIT(self, vdr, args):
+        self.reply(221, "fakevdr closing connection")
+        return False
+
+    def cmd_STAT(self, vdr, args):
+        self.reply(250, "100000MB 50000MB 50%")
+
+    def cmd_PLUG(self, vdr, args):
+        self.reply(214, ["Available plugins:", "fake v1.0.0 - Fake plugin", "End of plugin list"])
+
+    def cmd_LSTC(self, vdr, args):
+        withgroups = bool(args) and args[0] == ":groups"
+        with vdr._lock:
+            numbers = vdr._numbers()
+            if args and not withgroups:
+                if args[0].isdigit():
+                    channel = vdr._channelbynumber(int(args[0]))
+                else:
+                    channel = next((c for c in vdr.channels if not c.groupsep and c.channelid == args[0]), None)
+                if channel is None:
+                    status, lines = 501, "Channel \"" + args[0] + "\" not defined"
+                else:
+                    status, lines = 250, "{} {}".format(numbers[id(channel)], channel)
+            else:
+                status, lines = 250, []
+                for channel in vdr.channels:
+                    if channel.groupsep:
+                        if withgroups:
+                            lines.append("0 " + str(channel))
+                    else:
+                        lines.append("{} {}".format(numbers[id(channel)], channel))
+        self.reply(status, lines)
+
+    def cmd_LSTE(self, vdr, args):
+        # Building big replies is slow in Python. Cache them until the EPG
+        # data changes, so benchmarks measure the client.
+        key = " ".join(args)
+        with vdr._lock:
+            data = vdr._replycache.get(key)
+            if data is None:
+                lines = vdr._lste(args)
+                if lines:
+                    lines.append("End of EPG data")
+                    data = self.encode(215, lines, vdr.badcharset)
+                    if not args or args[0] not in ("now", "next"):
+                        vdr._replycache[key] = data
+        if data is None:
+            self.reply(550, "No schedule found")
+            return
+        self.send(data)
+
+    def cmd_CLRE(self, vdr, args):
+        found = True
+        with vdr._lock:
+            if args:
+                channelid = args[0]
+                if channelid.isdigit():
+                    channel = vdr._channelbynumber(int(channelid))
+                    channelid = channel.channelid if channel else None
+                found = channelid in vdr.schedules
+                if found:
+                    del vdr.schedules[channelid]
+            else:
+                vdr.schedules.clear()
+            if found:
+                vdr._replycache.clear()
+        if not found:
+            self.reply(550, "No EPG data found for channel \"" + args[0] + "\"")
+        else:
+            self.reply(250, "EPG data cleared")
+
+    def cmd_PUTE(self, vdr, args):
+        self.reply(354, "Enter EPG data, end with \".\" on a line by itself")
+        lines = []
+        if vdr.idletimeout:
+            self.connection.settimeout(vdr.idletimeout)
+        while True:
+            try:
+                line = self.rfile.readline()
+            except socket.timeout:
+                self.reply(221, "fakevdr closing connection")
+                return
+            if not line:
+                return False
+            line = line.decode("utf-8", errors="surrogateescape").rstrip("\r\n")
+            if line == ".":
+                break
+            lines.append(line)
+        # Like VDR the whole transaction is dropped if a line or a channel
+        # id is invalid
+        if any(not line or line[0] not in "CcEeTSDGRXV@" or
+               line[0] == "C" and not _CHANNELID.match(line[2:].split(" ", 1)[0])
+               for line in lines):
+            self.reply(451, "Error while processing EPG data")
+            return
+        with vdr._lock:
+            vdr._storeepg(lines)
+        self.reply(250, "EPG data processed")
+
+    def cmd_NEWC(self, vdr, args):
+        with vdr._lock:
+            channel, error = self.parsechannel(self.arguments)
+            if error is None:
+                vdr.channels.append(channel)
+                number = vdr._numbers()[id(channel)]
+        if error is not None:
+            self.reply(501, error)
+            return
+        self.reply(250, "{} {}".format(number, channel))
+
+    def cmd_MODC(self, vdr, args):
+        number, settings = (self.arguments.split(None, 1) + [""])[:2]
+        with vdr._lock:
+            current = vdr._channelbynumber(int(number)) if number.isdigit() else None
+            if current is None:
+                channel, error = None, "Channel \"" + number + "\" not defined"
+            else:
+                channel, error = self.parsechannel(settings, current)
+            if error is None:
+                vdr.channels[vdr.channels.index(current)] = channel
+        if error is not None:
+            self.reply(501, error)
+            return
+        self.reply(250, "{} {}".format(number, channel))
+
+    # Parses the channel string of NEWC and MODC. Returns a (channel, error)
+    # tuple. "error" is the reply text if it is invalid or not unique.
+    # Has to be called with "vdr._lock" held.
+    def parsechannel(self, settings, replaced = None):
+        vdr = self.server.fakevdr
+        try:
+            channel = Channel(settings, 0) if settings else None
+        except ValueError:
+            channel = None
+        if channel is None or channel.groupsep:
+            return None, "Error in channel settings"
+        for other in vdr.channels:
+            if other is not replaced and not other.groupsep and other.channelid == channel.channelid:
+                return None, "Channel settings are not unique"
+        return channel, None
+
+    def cmd_MOVC(self, vdr, args):
+        if len(args) != 2 or not args[0].isdigit() or not args[1].isdigit():
+            self.reply(501, "Error in channel number")
+            return
+        with vdr._lock:
+            status, message = vdr._movechannel(int(args[0]), int(args[1]))
+        self.reply(status, message)
+
+    def cmd_DELC(self, vdr, args):
+        with vdr._lock:
+            channel = vdr._channelbynumber(int(args[0])) if args[0].isdigit() else None
+            if channel is not None:
+                vdr.channels.remove(channel)
+        if channel is None:
+            self.reply(501, "Channel \"" + args[0] + "\" not defined")
+            return
+        self.reply(250, "Channel \"" + args[0] + "\" deleted")
@@ -0,0 +1,252 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Queries many VDR instances at the same time and merges the results:
+#
+#   fleet = VDRFleet(["vdr1.local", "vdr2.local:6419", ("10.0.0.5", 2001)])
+#   result = fleet.list_epg()
+#   schedules = result.merged
+#   for host, exception in result.errors.items():
+#       print("Failed:", host, exception)
+#
+# The hosts are queried concurrently with "AsyncSVDRPConnection" from a
+# private event loop, so this API can be used from blocking code.
+
+import asyncio
+from pysvdrp.aio import AsyncSVDRPConnection
+from pysvdrp.channels import Channels
+from pysvdrp.epg import Schedules, Schedule, _lste_command, _read_event
+from pysvdrp.exceptions import ActionNotTaken
+from pysvdrp.plugins import Plugins
+
+DEFAULT_PORT = 6419
+
+# Default time (seconds) one host may take, including connecting
+DEFAULT_TIMEOUT = 60
+
+
+# Result of a fleet query
+#
+# merged:  Merged result of all hosts that answered
+# results: Dict with the result of each host that answered. Keys are
+#          (host, port) tuples. See the methods of "VDRFleet" for the values.
+# errors:  Dict with the exception of each host that failed or timed out
+class FleetResult:
+    def __init__(self, merged):
+        self.merged = merged
+        self.results = {}
+        self.errors = {}
+
+    def __bool__(self):
+        return not self.errors
+
+
+class VDRFleet:
+    def __init__(self, hosts, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """
+        Creates a fleet of VDR instances
+
+        hosts: List of hosts. Each one is either a "host" or "host:port"
+               string or a (host, port) tuple.
+        timeout: Time in seconds each host may take for a query. Slower hosts
+                 are reported in "FleetResult.errors".
+        """
+        self.hosts = [_hostkey(host) for host in hosts]
+        self.timeout = timeout
+
+    def list_channels(self, withgroups: bool = False):
+        """
+        Gets the channel lists of all hosts. Returns a "FleetResult". Its
+        "merged" value is a "Channels" list with every channel id once (the
+        first one found wins, including its number and settings). The per
+        host values are the "Channels" lists of each host with their own
+        numbers and settings.
+
+        withgroups: If "True" the lists contain the group separators. They
+                    are not merged.
+        """
+        merged = Channels()
+        known = set()
+        async def query(conn):
+            channels = await conn.list_channels(withgroups)
+            for channel in channels:
+                if not channel.groupsep and channel.channelid not in known:
+                    known.add(channel.channelid)
+                    merged.append(channel)
+            return channels
+        return self._run(query, FleetResult(merged))
+
+    def list_epg(self, channel = '', filter = ''):
+        """
+        Gets EPG data of all hosts. Returns a "FleetResult". Its "merged"
+        value is one "Schedules" object for the whole fleet. Events are
+        identified by (channelid, eventid, version) and each one is only
+        parsed and stored once. If hosts know different versions of an
+        event, then the highest version is kept. The per host values are
+        the lists of channel ids the host sent EPG data for. Channels which
+        a failed host sent completely before the error are merged, too.
+
+        channel: Optional channel to get EPG for (EPG for all channels if not
+                 given). May be one of "channel number", "channel id" and
+                 "Channel object"
+        filter: [ now | next | at <Time> ]
+        """
+        merger = _EPGMerger()
+        async def query(conn):
+            await conn._send(_lste_command(channel, filter))
+            try:
+                status, message = await conn._recvmsg()
+            except ActionNotTaken:
+                return [] # Just ignore "No schedule found" error
+
+            channelids = []
+            block = []
+            while status < 0:
+                block.append(message)
+                if message[0] == "c":
+                    channelids.append(merger.add(block))
+                    block.clear()
+                status, message = await conn._recvmsg()
+            return channelids
+        result = self._run(query, FleetResult(merger.schedules))
+        merger.finish()
+        return result
+
+    def list_plugins(self):
+        """
+        Gets the plugin lists of all hosts. Returns a "FleetResult". Its
+        "merged" value is a "Plugins" list with every plugin name and
+        version once. The per host values are "Plugins" lists.
+        """
+        merged = Plugins()
+        known = set()
+        async def query(conn):
+            plugins = await conn.list_plugins()
+            for plugin in plugins:
+                key = (plugin["name"], plugin["version"])
+                if key not in known:
+                    known.add(key)
+                    merged.append(plugin)
+            return plugins
+        return self._run(query, FleetResult(merged))
+
+    # Runs "query(connection)" for all hosts at once and fills "result"
+    def _run(self, query, result):
+        async def queryhost(host):
+            try:
+                value = await asyncio.wait_for(self._query(host, query), self.timeout)
+            except Exception as e:
+                result.errors[host] = e
+            else:
+                result.results[host] = value
+
+        async def queryall():
+            await asyncio.gather(*[queryhost(host) for host in self.hosts])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(queryall())
+        finally:
+            loop.close()
+        return result
+
+    # Connects to one host, runs the query and disconnects
+    async def _query(self, host, query):
+        conn = AsyncSVDRPConnection(*host)
+        try:
+            await conn.connect()
+            value = await query(conn)
+        except BaseException:
+            # Timed out or broken. Don't wait for a clean shutdown.
+            conn._disconnect()
+            raise
+        await conn.close()
+        return value
+
+
+# Builds one "Schedules" object from the LSTE replies of several hosts.
+# Events which are already known are skipped before they are parsed.
+class _EPGMerger:
+    def __init__(self):
+        self.schedules = Schedules()
+        self._versions = {}
+        self._unsorted = set()
+
+    # Adds one channel block ("C" line up to "c" line). Returns the channel
+    # id.
+    def add(self, block):
+        iterator = iter(block)
+        channelid, channelname = next(iterator).split(" ", 2)[1:]
+        schedule = self.schedules.get(channelid)
+        if schedule is None:
+            schedule = Schedule()
+            schedule.channelname = channelname
+            self.schedules[channelid] = schedule
+            fresh = True
+        else:
+            fresh = False
+
+        versions = self._versions
+        for line in iterator:
+            if line[0] != "E":
+                continue
+            fields = line.split(" ", 6)
+            key = (channelid, int(fields[1]))
+            version = int(fields[5], 16)
+            known = versions.get(key)
+            if known is not None and known[0] >= version:
+                for line in iterator:
+                    if line[0] == "e":
+                        break
+                continue
+
+            event = _read_event(line, iterator)
+            if known is not None:
+                # A newer version may have another start time
+                position = known[1]
+                schedule[position] = event
+                self._unsorted.add(channelid)
+            else:
+                position = len(schedule)
+                schedule.append(event)
+                if not fresh:
+                    self._unsorted.add(channelid)
+            versions[key] = (version, position)
+        return channelid
+
+    # Sorts schedules which got events from more than one host or newer
+    # versions of events
+    def finish(self):
+        for channelid in self._unsorted:
+            self.schedules[channelid].sort(key=_starttime)
+        self._unsorted.clear()
+
+
+def _starttime(event):
+    return event.starttime
+
+# Returns the (host, port) tuple for a host given to "VDRFleet"
+def _hostkey(host):
+    if not isinstance(host, str):
+        host, port = host
+        return (host, int(port))
+    if host.startswith("["):
+        host, port = host[1:].split("]", 1)
+        return (host, int(port[1:]) if port else DEFAULT_PORT)
+    if host.count(":") == 1:
+        host, port = host.split(":")
+        return (host, int(port))
+    return (host, DEFAULT_PORT)
@@ -0,0 +1,165 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Instrumentation for "SVDRPConnection". Observers are callables which are
+# appended to the "observers" list of a connection. After every command they
+# are called with a "CommandMetrics" object:
+#
+#   collector = MetricsCollector()
+#   conn.observers.append(collector)
+#   conn.list_epg()
+#   print(collector.snapshot())
+#
+# If no observer is registered, nothing is measured.
+
+import threading
+import time
+from functools import wraps
+
+# Code flag of generator functions. Checked directly as importing "inspect"
+# is slow.
+_CO_GENERATOR = 0x20
+
+# Measurements of one command
+#
+# command:    Name of the called method (like "list_epg")
+# sendtime:   Time (seconds since epoch) the first line was sent to VDR
+# firstreply: Seconds from sending to the first reply line
+# recvtime:   Seconds from sending to the last reply line. For streaming
+#             methods like "iter_epg" this includes parsing.
+# parsetime:  Seconds from the last reply line until the method returned
+# lines:      Number of reply lines
+# bytes:      Number of bytes received
+# fallbacks:  Number of lines that needed charset detection
+class CommandMetrics:
+    __slots__ = ("command", "sendtime", "firstreply", "recvtime", "parsetime",
+                 "lines", "bytes", "fallbacks", "_start", "_lastreply")
+
+    def __init__(self, command: str):
+        self.command = command
+        self.sendtime = None
+        self.firstreply = 0.0
+        self.recvtime = 0.0
+        self.parsetime = 0.0
+        self.lines = 0
+        self.bytes = 0
+        self.fallbacks = 0
+        self._start = None
+        self._lastreply = None
+
+    # Called by "_send"
+    def sent(self):
+        if self._start is None:
+            self.sendtime = time.time()
+            self._start = time.perf_counter()
+
+    # Called by "_recvmsg" for each reply line
+    def received(self):
+        now = time.perf_counter()
+        if not self.lines and self._start is not None:
+            self.firstreply = now - self._start
+        self.lines += 1
+        self._lastreply = now
+
+    # Called when the method returns
+    def finished(self):
+        now = time.perf_counter()
+        if self._start is not None and self._lastreply is not None:
+            self.recvtime = self._lastreply - self._start
+            self.parsetime = now - self._lastreply
+
+
+# Decorator for command methods. Measures the method if observers are
+# registered. Commands called by other commands are measured as part of the
+# outer one.
+#
+# Generators are only attached to the connection while they run. If one is
+# abandoned without being exhausted or closed, then the following commands
+# are measured on their own. The abandoned generator reports when it is
+# closed or garbage collected.
+def instrumented(function):
+    if function.__code__.co_flags & _CO_GENERATOR:
+        @wraps(function)
+        def generatorwrapper(self, *args, **kwargs):
+            if not self.observers or self._metrics is not None:
+                yield from function(self, *args, **kwargs)
+                return
+            metrics = self._metrics = CommandMetrics(function.__name__)
+            generator = function(self, *args, **kwargs)
+            try:
+                for result in generator:
+                    self._metrics = None
+                    yield result
+                    self._metrics = metrics
+            finally:
+                # Reading the rest of the reply on early close is measured
+                if self._metrics is None:
+                    self._metrics = metrics
+                try:
+                    generator.close()
+                finally:
+                    _notify(self, metrics)
+        return generatorwrapper
+
+    @wraps(function)
+    def wrapper(self, *args, **kwargs):
+        if not self.observers or self._metrics is not None:
+            return function(self, *args, **kwargs)
+        metrics = self._metrics = CommandMetrics(function.__name__)
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            _notify(self, metrics)
+    return wrapper
+
+def _notify(connection, metrics):
+    if connection._metrics is metrics:
+        connection._metrics = None
+    metrics.finished()
+    for observer in connection.observers:
+        observer(metrics)
+
+
+# Observer that sums up the metrics per command. "snapshot" returns the
+# counters in a form that is easy to export to Prometheus or StatsD.
+class MetricsCollector:
+    FIELDS = ("firstreply", "recvtime", "parsetime", "lines", "bytes", "fallbacks")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, metrics: CommandMetrics):
+        with self._lock:
+            stats = self._stats.get(metrics.command)
+            if stats is None:
+                stats = dict.fromkeys(("count",) + self.FIELDS, 0)
+                self._stats[metrics.command] = stats
+            stats["count"] += 1
+            for field in self.FIELDS:
+                stats[field] += getattr(metrics, field)
+
+    def snapshot(self):
+        """
+        Returns a dict with one dict of counters per command name. Times are
+        summed up seconds.
+        """
+        with self._lock:
+            return {command: dict(stats) for command, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
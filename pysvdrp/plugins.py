@@ -15,11 +15,17 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from collections import UserList
+from pysvdrp.metrics import instrumented
 
 # Returns a list of plugins loaded into VDR
+@instrumented
 def list_plugins(self):
     self._send("PLUG")
     status, data = self._recvlist()
+    return _parse_plugins(data)
+
+# Parses the PLUG reply. Shared with the asyncio connection.
+def _parse_plugins(data):
     data.pop(0) # Remove first item ("Available plugins:")
     data.pop()  # Remove last item ("End of plugin list")
     result = Plugins()
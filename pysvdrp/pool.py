@@ -0,0 +1,135 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+from contextlib import contextmanager
+from pysvdrp import SVDRPConnection
+from pysvdrp.exceptions import SVDRPException
+
+# Number of connections we open to one VDR at the same time. VDR only serves
+# a few SVDRP clients at once (older versions only serve one)
+DEFAULT_MAXSIZE = 1
+
+# VDR closes SVDRP connections after "SVDRPTimeout" seconds (default: 300) of
+# inactivity. Idle connections older than this are not reused.
+DEFAULT_MAXIDLE = 240
+
+# Keeps warm SVDRP connections per (host, port) and hands them out to
+# borrowers. Example:
+#
+#   pool = SVDRPPool()
+#   with pool.connection("vdr.local") as vdr:
+#       channels = vdr.list_channels()
+class SVDRPPool:
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, maxidle: float = DEFAULT_MAXIDLE, timeout: float = None,
+                 channelcache = None) -> None:
+        """
+        Creates an empty connection pool
+
+        maxsize: Maximum number of concurrent connections to one VDR
+        maxidle: Idle connections older than this (in seconds) are dropped
+        timeout: Maximum time to wait for a free connection (default: forever)
+        channelcache: Optional "ChannelCache" shared by all connections
+        """
+        self.maxsize = maxsize
+        self.maxidle = maxidle
+        self.timeout = timeout
+        self.channelcache = channelcache
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    @contextmanager
+    def connection(self, host: str = "127.0.0.1", port: int = 6419):
+        """
+        Context manager that borrows a "SVDRPConnection" from the pool. If no
+        idle connection is available, then a new one is established. A
+        connection VDR closed in the meantime reconnects with its next
+        command.
+
+        Commands have to be completed (generators like "iter_epg" exhausted)
+        before the connection is returned to the pool.
+
+        host: VDR host to connect to (default: 127.0.0.1)
+        port: SVDRP port to use (default: 6419)
+        """
+        hostpool = self._hostpool(host, port)
+        if not hostpool.semaphore.acquire(timeout=self.timeout):
+            raise TimeoutError("No free SVDRP connection to " + host + ":" + str(port))
+
+        try:
+            conn = self._checkout(hostpool, host, port)
+            try:
+                yield conn
+            except SVDRPException:
+                # Error replies from VDR don't break the connection
+                self._checkin(hostpool, conn)
+                raise
+
+            # Other errors (socket errors, interrupted replies) leave the
+            # connection in an unknown state. It is only reused if the block
+            # completed.
+            self._checkin(hostpool, conn)
+        finally:
+            hostpool.semaphore.release()
+
+    def close(self):
+        """
+        Disconnects all idle connections
+        """
+        with self._lock:
+            idle = []
+            for hostpool in self._hosts.values():
+                idle += hostpool.idle
+                hostpool.idle.clear()
+        for conn, lastuse in idle:
+            conn.close()
+
+    def _hostpool(self, host, port):
+        with self._lock:
+            hostpool = self._hosts.get((host, port))
+            if hostpool is None:
+                hostpool = _HostPool(self.maxsize)
+                self._hosts[(host, port)] = hostpool
+            return hostpool
+
+    def _checkout(self, hostpool, host, port):
+        # Prefer the most recently used connection. No health check is needed
+        # as "SVDRPConnection" notices closed sockets and reconnects.
+        while True:
+            with self._lock:
+                if not hostpool.idle:
+                    break
+                conn, lastuse = hostpool.idle.pop()
+            if time.monotonic() - lastuse < self.maxidle:
+                return conn
+            conn.close()
+
+        conn = SVDRPConnection(host, port)
+        conn.channelcache = self.channelcache
+        return conn
+
+    def _checkin(self, hostpool, conn):
+        with self._lock:
+            hostpool.idle.append((conn, time.monotonic()))
+
+
+# Idle connections and borrower limit for one (host, port)
+class _HostPool:
+    def __init__(self, maxsize):
+        self.semaphore = threading.BoundedSemaphore(maxsize)
+        self.idle = []
+
@@ -0,0 +1,177 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Full text search over EPG data. The index can be filled while EPG data is
+# received:
+#
+#   index = SearchIndex()
+#   schedules = conn.list_epg(index=index)
+#   for channelid, event in index.search("tatort"):
+#       print(channelid, event.title)
+
+import re
+from bisect import bisect_left
+from heapq import nsmallest
+
+_TOKEN = re.compile(r"\w+")
+
+# Inverted index of the words in title, short text and description of
+# events. Words are case folded. Each query word also matches longer words
+# starting with it. Hits in the title rank higher than hits in the short
+# text which rank higher than hits in the description.
+#
+# Events are referenced by identity, so an event has to be removed before
+# it is modified in place and added again afterwards.
+class SearchIndex:
+    WEIGHTS = (("title", 4), ("shorttext", 2), ("description", 1))
+
+    def __init__(self, schedules = None) -> None:
+        """
+        Creates a search index
+
+        schedules: Optional "Schedules" object to add to the index
+        """
+        self._postings = {}
+        self._events = {}
+        self._words = None
+        if schedules is not None:
+            for channelid, schedule in schedules.items():
+                self.add_schedule(channelid, schedule)
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, channelid: str, event):
+        """
+        Adds an event of the given channel to the index
+        """
+        key = id(event)
+        if key in self._events:
+            self.remove(event)
+        weights = {}
+        for field, weight in self.WEIGHTS:
+            text = getattr(event, field)
+            if text:
+                for word in set(_TOKEN.findall(text.casefold())):
+                    weights[word] = weights.get(word, 0) + weight
+        postings = self._postings
+        for word, weight in weights.items():
+            posting = postings.get(word)
+            if posting is None:
+                posting = postings[word] = {}
+                self._words = None
+            posting[key] = weight
+        self._events[key] = (channelid, event, tuple(weights))
+
+    def add_schedule(self, channelid: str, schedule):
+        """
+        Adds all events of a "Schedule" to the index
+        """
+        for event in schedule:
+            self.add(channelid, event)
+
+    def remove(self, event):
+        """
+        Removes an event from the index. Unknown events are ignored.
+        """
+        key = id(event)
+        entry = self._events.pop(key, None)
+        if entry is None:
+            return
+        postings = self._postings
+        for word in entry[2]:
+            posting = postings[word]
+            del posting[key]
+            if not posting:
+                del postings[word]
+                self._words = None
+
+    def clear(self):
+        self._postings.clear()
+        self._events.clear()
+        self._words = None
+
+    def search(self, query: str, channelids = None, contents = None, limit: int = None):
+        """
+        Searches for events containing all words of "query". Returned is a
+        list of (channelid, Event) tuples with the best matches first.
+        Matches with the same rank are ordered by start time.
+
+        channelids: Optional channel id or list of channel ids to search in
+        contents: Optional genre code or list of genre codes (like "10" or
+                  "1" for all 0x1X genres). Events need to have one of their
+                  "contents" codes starting with one of them.
+        limit: Optional maximum number of results
+        """
+        words = _TOKEN.findall(query.casefold())
+        if not words:
+            return []
+
+        scores = None
+        for word in words:
+            matches = self._match(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {key: score + matches[key] for key, score in scores.items() if key in matches}
+            if not scores:
+                return []
+
+        if isinstance(channelids, str):
+            channelids = (channelids,)
+        if channelids is not None:
+            channelids = set(channelids)
+        if isinstance(contents, str):
+            contents = (contents,)
+        if contents is not None:
+            contents = tuple(code.upper() for code in contents)
+
+        results = []
+        for key, score in scores.items():
+            channelid, event, words = self._events[key]
+            if channelids is not None and channelid not in channelids:
+                continue
+            if contents is not None and not any(code.upper().startswith(contents) for code in event.contents or ()):
+                continue
+            results.append((-score, event.starttime, channelid, event))
+        if limit is not None:
+            results = nsmallest(limit, results, key=_rank)
+        else:
+            results.sort(key=_rank)
+        return [(channelid, event) for score, starttime, channelid, event in results]
+
+    # Returns the scores of all events containing a word starting with "word".
+    # Words which only match as prefix count half.
+    def _match(self, word):
+        if self._words is None:
+            self._words = sorted(self._postings)
+        words = self._words
+        postings = self._postings
+        scores = dict(postings.get(word, ()))
+        position = bisect_left(words, word)
+        if position < len(words) and words[position] == word:
+            position += 1
+        while position < len(words) and words[position].startswith(word):
+            for key, weight in postings[words[position]].items():
+                score = scores.get(key, 0)
+                if weight / 2 > score:
+                    scores[key] = weight / 2
+            position += 1
+        return scores
+
+
+def _rank(result):
+    return result[:2]
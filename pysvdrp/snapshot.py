@@ -0,0 +1,252 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compact binary snapshot of "Schedules" objects. Used by "Schedules.save"
+# and "Schedules.load".
+#
+# File layout (all numbers little endian):
+#
+#   header      magic, counts and section offsets
+#   strings     (count + 1) uint32 offsets followed by UTF-8 data. Every
+#               distinct string is stored once.
+#   channels    one record per channel: channel id, channel name (string
+#               indexes), first event, event count
+#   events      one fixed size record per event. Text fields are string
+#               indexes (-1 for None).
+#   components  string indexes of the "X" lines of all events
+#
+# Loading maps the file into memory. "Event" objects of a channel are only
+# created when its schedule is accessed for the first time. The map is closed
+# when the last schedule was read, or before "save" replaces the file.
+
+import mmap
+import os
+import struct
+import sys
+import weakref
+from array import array
+from pysvdrp.epg import Schedules, Schedule, Event
+
+MAGIC = b"PYSVDRP\x01"
+_HEADER = struct.Struct("<8sIIIIQQQQQ")
+_CHANNEL = struct.Struct("<iiII")
+_EVENT = struct.Struct("<IqiHHiiiiiiiIi")
+
+# Snapshots which still have their file mapped
+_opened = weakref.WeakSet()
+
+
+def save(schedules, path: str):
+    """
+    Writes "schedules" to a snapshot file. The file is replaced atomically.
+    """
+    strings = {}
+    def stringindex(value):
+        if value is None:
+            return -1
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    channels = bytearray()
+    events = bytearray()
+    components = array("I")
+    eventcount = 0
+    for channelid, schedule in schedules.items():
+        channels += _CHANNEL.pack(stringindex(channelid), stringindex(schedule.channelname), eventcount, len(schedule))
+        for event in schedule:
+            firstcomponent = len(components)
+            if event.components is not None:
+                components.extend(stringindex(component) for component in event.components)
+            events += _EVENT.pack(
+                event.eventid, event.starttime, event.duration, event.tableid, event.version,
+                stringindex(event.title), stringindex(event.shorttext),
+                stringindex(event.description),
+                stringindex(None if event.contents is None else " ".join(event.contents)),
+                stringindex(event.parentalrating), stringindex(event.vps),
+                stringindex(event.aux), firstcomponent,
+                -1 if event.components is None else len(event.components))
+            eventcount += 1
+
+    offsets = array("I", [0])
+    blob = bytearray()
+    for value in strings:
+        blob += value.encode("utf-8", errors="surrogateescape")
+        offsets.append(len(blob))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        components.byteswap()
+
+    stringspos = _HEADER.size
+    channelspos = stringspos + len(offsets) * 4 + len(blob)
+    eventspos = channelspos + len(channels)
+    componentspos = eventspos + len(events)
+    header = _HEADER.pack(MAGIC, len(strings), len(schedules), eventcount, len(components),
+                          stringspos, len(offsets) * 4, channelspos, eventspos, componentspos)
+
+    temppath = path + ".tmp"
+    with open(temppath, "wb") as fp:
+        fp.write(header)
+        fp.write(offsets.tobytes())
+        fp.write(blob)
+        fp.write(channels)
+        fp.write(events)
+        fp.write(components.tobytes())
+
+    # A mapped file can't be replaced on all platforms
+    for opened in list(_opened):
+        if _samefile(opened.path, path):
+            opened.close()
+    os.replace(temppath, path)
+
+
+def _samefile(path1, path2):
+    try:
+        return os.path.samefile(path1, path2)
+    except OSError:
+        return False
+
+
+def load(path: str):
+    """
+    Reads a snapshot file and returns a "Schedules" object. The events are
+    read from the memory mapped file when a schedule is first used.
+    """
+    snapshot = _Snapshot(path)
+    schedules = Schedules()
+    for channelid, channelname, first, count in snapshot.channels():
+        schedule = _LazySchedule(snapshot = snapshot, first = first, count = count)
+        schedule.channelname = channelname
+        schedules[channelid] = schedule
+        snapshot.pending[id(schedule)] = schedule
+    if not snapshot.pending:
+        snapshot.close()
+    return schedules
+
+
+# An opened snapshot file
+class _Snapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        _opened.add(self)
+
+        # Schedules which did not read their events yet, by their id()
+        self.pending = {}
+
+        magic, self._stringcount, self._channelcount, self._eventcount, componentcount, \
+            stringspos, offsetssize, self._channelspos, self._eventspos, componentspos = \
+            _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a pysvdrp EPG snapshot: " + path)
+
+        self._offsets = array("I", self._map[stringspos:stringspos + offsetssize])
+        self._components = array("I", self._map[componentspos:componentspos + componentcount * 4])
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+            self._components.byteswap()
+        self._blobpos = stringspos + offsetssize
+        self._strings = {}
+
+    def close(self):
+        """
+        Reads the events of all pending schedules and closes the map
+        """
+        for schedule in list(self.pending.values()):
+            schedule.data
+        self._map.close()
+        _opened.discard(self)
+
+    def string(self, index):
+        if index < 0:
+            return None
+        value = self._strings.get(index)
+        if value is None:
+            start = self._blobpos + self._offsets[index]
+            end = self._blobpos + self._offsets[index + 1]
+            value = self._map[start:end].decode("utf-8", errors="surrogateescape")
+            self._strings[index] = value
+        return value
+
+    def channels(self):
+        for index in range(self._channelcount):
+            channelid, channelname, first, count = _CHANNEL.unpack_from(self._map, self._channelspos + index * _CHANNEL.size)
+            yield self.string(channelid), self.string(channelname), first, count
+
+    def events(self, first, count):
+        string = self.string
+        start = self._eventspos + first * _EVENT.size
+        result = []
+        for eventid, starttime, duration, tableid, version, title, shorttext, description, \
+                contents, parentalrating, vps, aux, firstcomponent, componentcount in \
+                _EVENT.iter_unpack(self._map[start:start + count * _EVENT.size]):
+            event = Event()
+            event._eventid = eventid
+            event._starttime = starttime
+            event._duration = duration
+            event._tableid = tableid
+            event._version = version
+            event.title = string(title)
+            event.shorttext = string(shorttext)
+            event.description = string(description)
+            if contents >= 0:
+                event.contents = string(contents).split(" ")
+            event.parentalrating = string(parentalrating)
+            event.vps = string(vps)
+            event.aux = string(aux)
+            if componentcount >= 0:
+                event.components = [string(index) for index in self._components[firstcomponent:firstcomponent + componentcount]]
+            result.append(event)
+        return result
+
+
+# Schedule whose events are read from a snapshot on first access
+class _LazySchedule(Schedule):
+    def __init__(self, initlist = None, snapshot = None, first = 0, count = 0):
+        Schedule.__init__(self, initlist)
+        if snapshot is not None:
+            self._snapshot = snapshot
+            self._range = (first, count)
+            self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._snapshot.events(*self._range)
+            self._release()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        if getattr(self, "_snapshot", None) is not None:
+            self._release()
+
+    # Drops the reference to the snapshot. The last schedule closes it.
+    def _release(self):
+        snapshot = self._snapshot
+        self._snapshot = None
+        del snapshot.pending[id(self)]
+        if not snapshot.pending:
+            snapshot.close()
+
+    def __len__(self):
+        if self._data is None:
+            return self._range[1]
+        return len(self._data)
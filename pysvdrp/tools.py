@@ -14,6 +14,9 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from bisect import bisect_left
+from pysvdrp.channels import _invalidate_channelcache
+from pysvdrp.exceptions import SVDRPException
 
 def set_channel_position(self, sourceid, targetid, place_after = False, allow_breaking_groups = False):
     """
@@ -24,7 +27,9 @@ def set_channel_position(self, sourceid, targetid, place_after = False, allow_br
     place_after: sourceid is moved behind targetid if this is True
     allow_breaking_groups: If this is set to True groups can be emptied
     """
-    # Get a channel list first
+    # Get a channel list first. Moves are planned with its numbers, so a
+    # cached list has to be checked against VDR.
+    _invalidate_channelcache(self)
     channels = self.list_channels(True)
 
     # Get current list positions of the given items. Do exception handling here
@@ -32,15 +37,15 @@ def set_channel_position(self, sourceid, targetid, place_after = False, allow_br
     try:
         sourceindex = channels.find_by_channelid(sourceid)
     except ValueError as e:
-        raise SVDRPError("Source id " + sourceid + "invalid!", 550) from e
+        raise SVDRPException("Source id " + sourceid + "invalid!", 550) from e
     try:
         targetindex = channels.find_by_channelid(targetid)
     except ValueError as e:
-        raise SVDRPError("Target id " + targetid + "invalid!", 550) from e
+        raise SVDRPException("Target id " + targetid + "invalid!", 550) from e
 
     # Group emptying protection. Check the surroundings
     if not allow_breaking_groups:
-        groupex = SVDRPError("Moving this channel would empty a group which is not allowed!", 550)
+        groupex = SVDRPException("Moving this channel would empty a group which is not allowed!", 550)
         if sourceindex == 0:
             if channels[1].groupsep:
                 raise groupex
@@ -54,7 +59,7 @@ def set_channel_position(self, sourceid, targetid, place_after = False, allow_br
     # We allow our own group separator channel IDs here. So translate their
     # positions to something VDR understands
     if channels[sourceindex].groupsep:
-        raise SVDRPError("It is not allowed to move group separators!", 550)
+        raise SVDRPException("It is not allowed to move group separators!", 550)
     if channels[targetindex].groupsep:
         if place_after:
             targetindex += 1
@@ -74,7 +79,7 @@ def set_channel_position(self, sourceid, targetid, place_after = False, allow_br
     self.move_channel(sourcenumber, targetnumber)
 
     # Now recheck where our source and our target are.
-    channels = self._svdrp.list_channels(True)
+    channels = self.list_channels(True)
     sourceindex = channels.find_by_channelid(sourceid)
     targetindex = channels.find_by_channelid(targetid)
 
@@ -84,3 +89,276 @@ def set_channel_position(self, sourceid, targetid, place_after = False, allow_br
         sourcenumber = channels[sourceindex].number
         targetnumber = channels[targetindex].number
         self.move_channel(sourcenumber, targetnumber)
+
+
+def apply_channel_order(self, desired_ids, maxpasses: int = 3):
+    """
+    Reorders the channel list so the given channels appear in the given order.
+    The channel list is fetched once and a short sequence of moves is
+    calculated locally. Channels which already are in the right relative
+    order (the longest increasing subsequence) are not moved at all. The
+    result is verified with one final channel list request.
+
+    Channels which are not in "desired_ids" stay where they are. Group
+    separators can't be moved, so a moved channel may end up in a different
+    group than the one its neighbors are in.
+
+    desired_ids: List of channel ids in the wanted order
+    maxpasses: If VDR does not place channels as expected (VDR 2.4.1 may
+               place a channel one off), a new plan is calculated from the
+               actual channel list. This limits the number of attempts.
+
+    Returns the number of moves that were sent to VDR.
+    """
+    # Moves are planned with the numbers of this list, so a cached list has
+    # to be checked against VDR
+    _invalidate_channelcache(self)
+    return _reorder_channels(self, self.list_channels(True), desired_ids, maxpasses)
+
+
+# Does the work of "apply_channel_order", starting with the already fetched
+# current channel list "channels"
+def _reorder_channels(self, channels, desired_ids, maxpasses = 3):
+    moves = 0
+    for attempt in range(maxpasses):
+        plan = _plan_channel_order(channels, desired_ids)
+        if not plan:
+            return moves
+
+        # The plan already has the numbers after each move, so the moves
+        # are pipelined
+        with self.batch() as batch:
+            for sourcenumber, targetnumber in plan:
+                batch.move_channel(sourcenumber, targetnumber)
+        moves += len(plan)
+
+        channels = self.list_channels(True)
+        if _channel_order(channels, desired_ids) == list(desired_ids):
+            return moves
+
+    raise SVDRPException("Failed to bring channels into the wanted order!", 550)
+
+
+def sync_channels(self, target, delete: bool = True, order: bool = True):
+    """
+    Makes the channel list of VDR match "target". The current list is
+    fetched once and compared by channel id. Only the differences are sent:
+    MODC for channels with changed settings, DELC for channels which are not
+    in "target" (from the highest number down, so the other numbers stay
+    valid), NEWC for missing channels and finally the moves of
+    "apply_channel_order". Modifications, deletions and additions are
+    pipelined in one batch.
+
+    Group separators are neither added nor removed. Separators in "target"
+    are ignored.
+
+    target: The wanted channels as "Channels" list or any other iterable of
+            "Channel" objects
+    delete: If False, channels which are not in "target" are kept
+    order: If False, the channel order is not changed. New channels are
+           added to the end of the list.
+
+    Returns a dict with the channel ids which were "added", "modified" and
+    "deleted" and the number of "moves". If VDR rejects a command, then the
+    first error is raised after all commands were sent.
+    """
+    target = [channel for channel in target if not channel.groupsep]
+    _invalidate_channelcache(self)
+    channels = self.list_channels(True)
+    modify, remove, add = _plan_channel_sync(channels, target, delete)
+
+    with self.batch() as batch:
+        for number, channel in modify:
+            batch.modify_channel(number, channel)
+        for number, channel in remove:
+            batch.delete_channel(number)
+        for channel in add:
+            batch.new_channel(channel)
+
+    # The list is only fetched again if it was changed
+    moves = 0
+    if order:
+        if modify or remove or add:
+            channels = self.list_channels(True)
+        moves = _reorder_channels(self, channels, [channel.channelid for channel in target])
+
+    return {
+        "added": [channel.channelid for channel in add],
+        "modified": [channel.channelid for number, channel in modify],
+        "deleted": [channel.channelid for number, channel in remove],
+        "moves": moves
+    }
+
+
+# Compares the current channel list with the wanted channels. Returned are
+# the (number, wanted channel) tuples to modify, the (number, channel)
+# tuples to delete (highest number first) and the channels to add.
+def _plan_channel_sync(channels, target, delete):
+    wanted = {}
+    for channel in target:
+        if channel.channelid in wanted:
+            raise SVDRPException("Channel id " + channel.channelid + " is given twice!", 550)
+        wanted[channel.channelid] = channel
+
+    modify = []
+    remove = []
+    known = set()
+    for channel in channels:
+        if channel.groupsep:
+            continue
+        known.add(channel.channelid)
+        wantedchannel = wanted.get(channel.channelid)
+        if wantedchannel is None:
+            if delete:
+                remove.append((channel.number, channel))
+        elif str(wantedchannel) != str(channel):
+            modify.append((channel.number, wantedchannel))
+    remove.sort(key=_firstitem, reverse=True)
+
+    add = [channel for channel in target if channel.channelid not in known]
+    return modify, remove, add
+
+def _firstitem(item):
+    return item[0]
+
+
+# Returns the given channel ids in the order they currently have in the list
+def _channel_order(channels, desired_ids):
+    wanted = set(desired_ids)
+    return [channel.channelid for channel in channels if channel.channelid in wanted]
+
+
+# Returns the numbers VDR assigns to the channels in "order". Group separators
+# with a number ("@<number>") make the numbering continue at that number.
+def _renumber(order):
+    numbers = {}
+    number = 1
+    for channel in order:
+        if channel.groupsep:
+            if channel.number > number:
+                number = channel.number
+        else:
+            numbers[id(channel)] = number
+            number += 1
+    return numbers
+
+
+# Returns the (longest) set of ranks that are already in increasing order
+def _longest_increasing(ranks):
+    tails = []
+    tailindexes = []
+    previous = [-1] * len(ranks)
+    for index, rank in enumerate(ranks):
+        position = bisect_left(tails, rank)
+        if position > 0:
+            previous[index] = tailindexes[position - 1]
+        if position == len(tails):
+            tails.append(rank)
+            tailindexes.append(index)
+        else:
+            tails[position] = rank
+            tailindexes[position] = index
+
+    result = set()
+    index = tailindexes[-1] if tailindexes else -1
+    while index != -1:
+        result.add(ranks[index])
+        index = previous[index]
+    return result
+
+
+# Calculates the moves needed to bring the channels in "desired_ids" into
+# order. Returned is a list of (source number, target number) tuples for
+# "move_channel".
+#
+# VDR moves a channel to the list position of the target channel. So a
+# channel moved downwards lands behind the target and a channel moved upwards
+# lands in front of the target. The moves are simulated on a copy of the list
+# to get the channel numbers for the next move.
+def _plan_channel_order(channels, desired_ids):
+    rank = {}
+    for channelid in desired_ids:
+        try:
+            index = channels.find_by_channelid(channelid)
+        except ValueError as e:
+            raise SVDRPException("Channel id " + channelid + " invalid!", 550) from e
+        if channels[index].groupsep:
+            raise SVDRPException("It is not allowed to move group separators!", 550)
+        if channelid in rank:
+            raise SVDRPException("Channel id " + channelid + " is given twice!", 550)
+        rank[channelid] = len(rank)
+
+    order = list(channels)
+    byrank = [None] * len(rank)
+    ranks = []
+    for channel in order:
+        if channel.channelid in rank:
+            byrank[rank[channel.channelid]] = channel
+            ranks.append(rank[channel.channelid])
+    stable = _longest_increasing(ranks)
+
+    plan = []
+    if not stable:
+        return plan
+    last = max(stable)
+
+    # Going from the last stable channel to the first wanted one, every
+    # channel which needs to be moved is placed directly in front of its
+    # wanted successor. All successors already have their final relative
+    # order at that point.
+    for current in reversed(range(last)):
+        if current in stable:
+            continue
+
+        channel = byrank[current]
+        sourceindex = order.index(channel)
+        successorindex = order.index(byrank[current + 1])
+        if sourceindex > successorindex:
+            targetindex = successorindex
+        else:
+            targetindex = successorindex - 1
+            while order[targetindex].groupsep:
+                targetindex -= 1
+        _move(order, plan, sourceindex, targetindex)
+
+    # The wanted channels behind the last stable one are placed directly
+    # behind their wanted predecessor, so they don't wander to the end of
+    # the list.
+    for current in range(last + 1, len(byrank)):
+        channel = byrank[current]
+        sourceindex = order.index(channel)
+        predecessorindex = order.index(byrank[current - 1])
+        if sourceindex < predecessorindex:
+            targetindex = predecessorindex
+        else:
+            targetindex = predecessorindex + 1
+            while order[targetindex].groupsep:
+                targetindex += 1
+        _move(order, plan, sourceindex, targetindex)
+
+    return plan
+
+# Adds the move of the channel at "sourceindex" to "targetindex" to "plan"
+# and simulates it on "order"
+#
+# A channel moved downwards to the first channel of a group with a start
+# number ("@<number>") is placed in front of it by VDR, behind the group
+# separator. The target channel is moved up in front of the channel then.
+def _move(order, plan, sourceindex, targetindex):
+    if targetindex == sourceindex:
+        return
+    numbers = _renumber(order)
+    source = order[sourceindex]
+    target = order[targetindex]
+    plan.append((numbers[id(source)], numbers[id(target)]))
+
+    before = order[targetindex - 1]
+    if sourceindex < targetindex and before.groupsep and before.number == numbers[id(target)]:
+        order.remove(source)
+        order.insert(order.index(target), source)
+        numbers = _renumber(order)
+        plan.append((numbers[id(target)], numbers[id(source)]))
+        order.remove(target)
+        order.insert(order.index(source), target)
+    else:
+        order.insert(targetindex, order.pop(sourceindex))
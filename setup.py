@@ -16,6 +16,9 @@ setuptools.setup(
     install_requires=[
         'cchardet',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU Lesser General Public License v3 or later (LGPLv3+)",
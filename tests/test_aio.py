@@ -0,0 +1,83 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+from pysvdrp import SVDRPConnection
+from pysvdrp.aio import AsyncSVDRPConnection
+from pysvdrp.fakevdr import FakeVDR
+
+
+def test_aio_cancelled_command():
+    async def run(vdr):
+        async with AsyncSVDRPConnection(vdr.host, vdr.port) as conn:
+            try:
+                await asyncio.wait_for(conn.list_channels(), 0.3)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                raise AssertionError("list_channels wasn't cancelled")
+            assert len(await conn.list_plugins()) == 1
+            assert len(await conn.list_channels()) == 3000
+
+    with FakeVDR(channels=3000, events=0, bandwidth=300000) as vdr:
+        asyncio.run(run(vdr))
+
+def test_aio_cancelled_list_epg():
+    async def run(vdr):
+        async with AsyncSVDRPConnection(vdr.host, vdr.port) as conn:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(conn.list_epg(), 0.3)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                raise AssertionError("list_epg wasn't cancelled")
+            # The rest of the reply is dropped, not read
+            assert time.perf_counter() - start < 1.5
+            assert len(await conn.list_plugins()) == 1
+
+    with FakeVDR(channels=100, events=12000, bandwidth=400000) as vdr:
+        asyncio.run(run(vdr))
+
+def test_aio_same_results_as_sync():
+    async def run(vdr):
+        async with AsyncSVDRPConnection(vdr.host, vdr.port) as conn:
+            channels = await conn.list_channels()
+            schedules = await conn.list_epg()
+            streamed = [channelid async for channelid, schedule in conn.iter_epg()]
+            channel = await conn.get_channel(3)
+            await conn.move_channel(1, 5)
+            moved = await conn.list_channels()
+            await conn.delete_channel("S19.2E-1-1000-28009")
+            await conn.put_epg(str(schedules))
+            cleared = await conn.clear_epg("S19.2E-1-1000-28000")
+            return channels, schedules, streamed, channel, moved, cleared
+
+    with FakeVDR(channels=10, events=30) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        expected_channels = [str(channel) for channel in conn.list_channels()]
+        expected_epg = str(conn.list_epg())
+        channels, schedules, streamed, channel, moved, cleared = asyncio.run(run(vdr))
+        remaining = [channel.channelid for channel in conn.list_channels()]
+
+    assert [str(channel) for channel in channels] == expected_channels
+    assert str(schedules) == expected_epg
+    assert streamed == list(schedules)
+    assert channel.number == 3 and channel.channelid == "S19.2E-1-1000-28002"
+    assert moved[4].channelid == "S19.2E-1-1000-28000"
+    assert "S19.2E-1-1000-28009" not in remaining and len(remaining) == 9
+    assert cleared is True
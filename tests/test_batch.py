@@ -0,0 +1,68 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.exceptions import ParameterError, CommandUnrecognized
+from pysvdrp.fakevdr import FakeVDR
+
+
+def test_results_in_order():
+    with FakeVDR(channels=20, events=20) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        with conn.batch(window=3) as batch:
+            results = [batch.get_channel(number) for number in range(1, 21)]
+            raw = batch.command("PLUG")
+            cleared = batch.clear_epg("S19.2E-1-1000-28000")
+            notfound = batch.clear_epg("S19.2E-1-1000-28000")
+            with pytest.raises(RuntimeError):
+                results[0].result()
+
+        assert [result.result().number for result in results] == list(range(1, 21))
+        assert results[4].result().channelid == "S19.2E-1-1000-28004"
+        assert raw.result() == (214, ["Available plugins:", "fake v1.0.0 - Fake plugin", "End of plugin list"])
+        assert cleared.result() is True
+        assert notfound.result() is False
+        assert len(conn.list_channels()) == 20
+
+def test_error_replies():
+    with FakeVDR(channels=5, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        with pytest.raises(ParameterError):
+            with conn.batch() as batch:
+                first = batch.get_channel(1)
+                missing = batch.get_channel(99)
+                unknown = batch.command("FOOBAR")
+                last = batch.move_channel(1, 5)
+
+        # All commands were sent, the first error is raised
+        assert first.result().number == 1
+        assert isinstance(missing.exception, ParameterError)
+        with pytest.raises(ParameterError):
+            missing.result()
+        assert isinstance(unknown.exception, CommandUnrecognized)
+        assert last.exception is None
+        assert conn.list_channels()[-1].channelid == "S19.2E-1-1000-28000"
+
+def test_exception_drops_queue():
+    with FakeVDR(channels=5, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        with pytest.raises(KeyError):
+            with conn.batch() as batch:
+                batch.delete_channel(1)
+                raise KeyError()
+        assert not any(command.startswith("DELC") for command in vdr.commands)
+        assert len(conn.list_channels()) == 5
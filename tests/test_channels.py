@@ -0,0 +1,177 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import random
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.channelcache import ChannelCache
+from pysvdrp.channels import Channel, _parse_channels
+from pysvdrp.fakevdr import FakeVDR, synthetic_channels
+
+
+def channelids(connection):
+    return [channel.channelid for channel in connection.list_channels()]
+
+def test_delete_channel_ignores_stale_cache():
+    with FakeVDR(channels=10, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        conn.channelcache = ChannelCache()
+        conn.list_channels()
+
+        # Renumber the channels behind the back of "conn"
+        other = SVDRPConnection(vdr.host, vdr.port)
+        other.move_channel(5, 1)
+        conn.delete_channel("S19.2E-1-1000-28004")
+        ids = channelids(other)
+        assert "S19.2E-1-1000-28004" not in ids
+        assert "S19.2E-1-1000-28003" in ids
+
+        other.move_channel(5, 1)
+        with conn.batch() as batch:
+            batch.delete_channel("S19.2E-1-1000-28002")
+        assert "S19.2E-1-1000-28002" not in channelids(other)
+
+def test_channel_order_trailing_channel():
+    lines = synthetic_channels(4)
+    lines = ["0 :Group A", "1 " + lines[0], "2 " + lines[1],
+             "0 :Group B", "3 " + lines[2], "4 " + lines[3]]
+    with FakeVDR(channellines=lines, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        channels = conn.list_channels()
+        moves = conn.apply_channel_order([channels[1].channelid, channels[0].channelid])
+        assert moves == 1
+        assert [channel.name for channel in conn.list_channels(True)] == \
+               ["Group A", "Channel 1", "Channel 0", "Group B", "Channel 2", "Channel 3"]
+
+def test_channel_order_random():
+    rng = random.Random(3)
+    lines = []
+    for index, line in enumerate(synthetic_channels(40)):
+        if index % 7 == 0:
+            lines.append("0 :Group {}".format(index))
+        lines.append("{} {}".format(index + 1, line))
+    for trial in range(10):
+        with FakeVDR(channellines=lines, events=0) as vdr:
+            conn = SVDRPConnection(vdr.host, vdr.port)
+            wanted = rng.sample(channelids(conn), rng.randint(1, 40))
+            conn.apply_channel_order(wanted)
+            assert [channelid for channelid in channelids(conn) if channelid in set(wanted)] == wanted
+
+def test_sync_channels_repeat_sends_one_lstc():
+    with FakeVDR(channels=20, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        target = list(reversed(conn.list_channels()))
+        del target[3]
+        conn.sync_channels(target)
+        assert channelids(conn) == [channel.channelid for channel in target]
+
+        del vdr.commands[:]
+        result = conn.sync_channels(target)
+        assert result == {"added": [], "modified": [], "deleted": [], "moves": 0}
+        assert vdr.commands == ["LSTC :groups"]
+
+def test_channel_order_numbered_groups():
+    rng = random.Random(7)
+    for trial in range(20):
+        lines = []
+        for index, line in enumerate(synthetic_channels(30)):
+            if index % 5 == 0:
+                lines.append("0 :@{} Group".format(index * 2 + 1) if rng.random() < 0.6 else "0 :Group")
+            lines.append("0 " + line)
+        with FakeVDR(channellines=lines, events=0) as vdr:
+            conn = SVDRPConnection(vdr.host, vdr.port)
+            wanted = rng.sample(channelids(conn), rng.randint(2, 30))
+            conn.apply_channel_order(wanted)
+            assert [channelid for channelid in channelids(conn) if channelid in set(wanted)] == wanted
+            # The plan matched what VDR did, so no second pass was needed
+            assert vdr.commands.count("LSTC :groups") <= 2
+
+def test_channels_indexes():
+    with FakeVDR(channels=10, events=0) as vdr:
+        channels = SVDRPConnection(vdr.host, vdr.port).list_channels()
+
+    assert channels.find_by_number(4) == 3
+    assert channels.find_by_channelid("S19.2E-1-1000-28005") == 5
+    assert channels.find_by_key("S19.2E", 1, 1000, 28002) == 2
+    with pytest.raises(ValueError):
+        channels.find_by_number(11)
+
+    # Modifications of the list drop the indexes
+    channels.append(channels[0])
+    assert channels.find_by_channelid("S19.2E-1-1000-28000") == 0
+    del channels[0]
+    assert channels.find_by_channelid("S19.2E-1-1000-28000") == 9
+    channels.sort(key=lambda channel: channel.sid)
+    assert channels.find_by_number(1) == 0
+    channels.remove(channels[0])
+    with pytest.raises(ValueError):
+        channels.find_by_number(1)
+    channels.insert(0, channels.pop())
+    assert channels.find_by_channelid("S19.2E-1-1000-28009") == 0
+
+    # In place changes need "reindex"
+    channels[0].sid = 30000
+    channels.reindex()
+    assert channels.find_by_key("S19.2E", 1, 1000, 30000) == 0
+    with pytest.raises(ValueError):
+        channels.find_by_channelid("S19.2E-1-1000-28009")
+
+def test_cache_answers_without_lstc(tmp_path):
+    path = str(tmp_path / "channels.json")
+    with FakeVDR(channels=10, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        conn.channelcache = ChannelCache(path=path)
+        assert len(conn.list_channels()) == 10
+        assert conn.get_channel(3).channelid == "S19.2E-1-1000-28002"
+        assert conn.get_channel("S19.2E-1-1000-28004").number == 5
+        assert sum(command.startswith("LSTC") for command in vdr.commands) == 1
+        digest = conn.channelcache.digest(conn)
+
+        # Own changes invalidate the cache
+        conn.move_channel(1, 10)
+        assert conn.list_channels()[-1].channelid == "S19.2E-1-1000-28000"
+        assert conn.channelcache.digest(conn) != digest
+
+        # A restarted process loads the cache file
+        vdr.commands.clear()
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        conn.channelcache = ChannelCache(path=path)
+        assert conn.list_channels()[-1].channelid == "S19.2E-1-1000-28000"
+        assert not any(command.startswith("LSTC") for command in vdr.commands)
+
+        # Lists older than "maxage" are checked against VDR again
+        conn.channelcache.maxage = 0
+        conn.list_channels()
+        assert sum(command.startswith("LSTC") for command in vdr.commands) == 1
+
+def test_parse_channels_like_channel():
+    lines = ["1 Das Erste HD,ARD;ARD:11494:HC23M5O35P0S1:S19.2E:22000:5101=27:5102=deu@3,5103=mis@3;5106=deu@106:5104;5105=deu:0:10301:1:1019:0",
+             "0 :@100 Regional",
+             "100 Radio:93500:I0:T:0:0:201:0:0:12:8468:3:0",
+             "101 Kabel, Sender;Provider, Inc:450000:M256:C:6900:0:0:0:1702:28:1:1000:5",
+             "0 :Other"]
+    channels = _parse_channels(lines)
+    assert [channel.groupsep for channel in channels] == [False, True, False, False, True]
+    assert [channel.channelid for channel in channels] == [
+        "S19.2E-1-1019-10301", "GROUP1", "T-8468-3-12", "C-1-1000-28-5", "GROUP2"]
+    for line, channel in zip(lines, channels):
+        number, channelstring = line.split(" ", 1)
+        expected = Channel(channelstring, number)
+        for name in Channel.__slots__:
+            if name in ("groupnumber", "_channelid", "_channelidkey"):
+                continue
+            assert getattr(channel, name, None) == getattr(expected, name, None), name
+        assert str(channel) == channelstring
@@ -0,0 +1,67 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.columnar import EPGColumns, NUMERIC_COLUMNS, STRING_COLUMNS, StringColumn
+from pysvdrp.fakevdr import FakeVDR
+
+
+def test_columns_match_schedules():
+    with FakeVDR(channels=3) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        schedules = conn.list_epg()
+        columns = conn.list_epg_columns()
+
+    assert len(columns) == sum(len(schedule) for schedule in schedules.values())
+    assert columns.channelids == list(schedules)
+    assert str(columns.to_schedules()) == str(schedules)
+    assert str(EPGColumns.from_schedules(schedules).to_schedules()) == str(schedules)
+
+    first = next(iter(schedules.values()))[0]
+    assert columns.title[0] == first.title
+    assert columns.event(0).description == first.description
+
+def test_string_column():
+    column = StringColumn(["a", None, "", "äö"])
+    assert len(column) == 4
+    assert list(column) == ["a", None, "", "äö"]
+    assert column[-1] == "äö"
+    column.extend([None, "b"])
+    assert list(column) == ["a", None, "", "äö", None, "b"]
+
+def test_empty_reply():
+    with FakeVDR(channels=3, events=3) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        columns = conn.list_epg_columns("S19.2E-1-1-1")
+    assert len(columns) == 0
+    assert all(len(getattr(columns, name)) == 0 for name in STRING_COLUMNS)
+
+def test_to_numpy_dtypes():
+    numpy = pytest.importorskip("numpy")
+    with FakeVDR(channels=3, events=30) as vdr:
+        columns = SVDRPConnection(vdr.host, vdr.port).list_epg_columns()
+
+    arrays = columns.to_numpy()
+    for name, typecode in NUMERIC_COLUMNS:
+        column = getattr(columns, name)
+        assert arrays[name].dtype.itemsize == column.itemsize
+        assert arrays[name].dtype.kind == ("u" if typecode.isupper() else "i")
+        assert arrays[name].tolist() == column.tolist()
+
+    # The arrays share memory with the columns
+    columns.duration[0] = 12345
+    assert arrays["duration"][0] == 12345
@@ -0,0 +1,103 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.fakevdr import FakeVDR
+
+
+def test_reconnect_greeting_not_counted():
+    with FakeVDR(channels=5, events=0, idletimeout=0.2) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        metrics = []
+        conn.observers.append(metrics.append)
+        time.sleep(0.4)
+        conn.list_plugins()
+        assert metrics[0].lines == 3
+        assert metrics[0].firstreply > 0
+
+def test_paused_generator_deadline():
+    with FakeVDR(channels=20, events=400) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        generator = conn.iter_epg(deadline=0.3)
+        next(generator)
+        time.sleep(0.4)
+        # Other commands are not limited by the deadline of the generator
+        assert len(conn.list_channels()) == 20
+        with conn.deadline(10):
+            generator.close()
+        assert conn._deadline is None
+        assert len(conn.list_channels()) == 20
+
+        generator = conn.iter_epg(deadline=0.3)
+        next(generator)
+        time.sleep(0.4)
+        with pytest.raises(TimeoutError):
+            list(generator)
+        assert len(conn.list_epg()) == 20
+
+def test_deadlines_ending_out_of_order():
+    with FakeVDR(channels=5, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        inner = conn.deadline(0.1)
+        inner.__enter__()
+        with conn.deadline(10):
+            inner.__exit__(None, None, None)
+        time.sleep(0.2)
+        assert conn._deadline is None
+        assert len(conn.list_channels()) == 5
+
+def test_fallback_encoding_per_channel():
+    pytest.importorskip("cchardet")
+    titles = ["Live-Übertragung vom Fußball aus München mit Müller",
+              "Новости дня: погода и спорт в Москве сегодня вечером",
+              "Ειδήσεις της ημέρας: ο καιρός και τα αθλητικά απόψε"]
+    encodings = ["iso-8859-1", "windows-1251", "iso-8859-7"]
+    lines = []
+    for number, (title, encoding) in enumerate(zip(titles, encodings)):
+        # The fake VDR sends surrogate escaped characters as raw bytes
+        raw = title.encode(encoding).decode("utf-8", errors="surrogateescape")
+        lines += ["C S19.2E-1-1000-{} Channel {}".format(28000 + number, number),
+                  "E 1 1609085723 1800 4E 1", "T " + raw, "e", "c"]
+    with FakeVDR(channels=3, epglines=lines) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        schedules = conn.list_epg()
+        assert [schedule[0].title for schedule in schedules.values()] == titles
+
+def test_bad_charset_lines():
+    pytest.importorskip("cchardet")
+    channellines = ["{} Fernsehen Süd {};Münchner Rundfunk:11494:h:S19.2E:22000:0:0:0:0:{}:1:1000:0".format(
+        number, number, 28000 + number) for number in range(1, 11)]
+    with FakeVDR(channellines=channellines, events=50) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        channels = [str(channel) for channel in conn.list_channels()]
+        schedules = str(conn.list_epg())
+
+    # Some channel names in ISO-8859-1 (the fake VDR sends surrogate escaped
+    # characters as raw bytes) and every third EPG line in ISO-8859-1. Both
+    # the bulk decoding of lists and the line by line decoding of EPG data
+    # have to detect them.
+    channellines[3::4] = [line.encode("iso-8859-1").decode("utf-8", errors="surrogateescape")
+                          for line in channellines[3::4]]
+    with FakeVDR(channellines=channellines, events=50, badcharset=3) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        metrics = []
+        conn.observers.append(metrics.append)
+        assert [str(channel) for channel in conn.list_channels()] == channels
+        assert str(conn.list_epg()) == schedules
+        assert metrics[0].fallbacks == 2
+        assert metrics[1].fallbacks > 0
@@ -0,0 +1,232 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import gc
+import io
+import pickle
+import time
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.epg import Event, LazyEvent, Schedule, Schedules, _pute_transactions
+from pysvdrp.exceptions import ActionAborted
+from pysvdrp.fakevdr import FakeVDR, SYNTHETIC_START, synthetic_epg
+
+
+def make_schedules(events, channels = 2):
+    schedules = Schedules()
+    for channel in range(channels):
+        schedule = Schedule()
+        schedule.channelname = "Channel {}".format(channel)
+        for number in range(events[channel] if isinstance(events, list) else events):
+            event = Event()
+            event.eventid = number + 1
+            event.starttime = SYNTHETIC_START + number * 1800
+            event.duration = 1800
+            event.title = "Event {} of {}".format(number, channel)
+            schedule.append(event)
+        schedules["S19.2E-1-1000-{}".format(28000 + channel)] = schedule
+    return schedules
+
+
+def test_event_accepts_strings():
+    event = Event()
+    event.eventid = "42"
+    event.starttime = "1609085723"
+    event.duration = "1800"
+    event.tableid = "4E"
+    event.version = "1f"
+    event.title = "Title"
+    assert (event.eventid, event.tableid, event.version) == (42, 0x4E, 0x1F)
+    schedule = Schedule()
+    schedule.append(event)
+    assert str(schedule).splitlines()[0] == "E 42 1609085723 1800 4E 1F"
+
+    with FakeVDR(channels=3, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        schedules = Schedules()
+        schedules["S19.2E-1-1000-28000"] = schedule
+        conn.put_epg(schedules)
+        received = conn.list_epg()["S19.2E-1-1000-28000"][0]
+        assert (received.eventid, received.tableid, received.version) == (42, 0x4E, 0x1F)
+
+def test_abandoned_generator_metrics():
+    with FakeVDR(channels=10, events=50) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        commands = []
+        conn.observers.append(lambda metrics: commands.append(metrics.command))
+        generator = conn.iter_epg()
+        next(generator)
+        conn.list_channels()
+        assert commands == ["list_channels"]
+
+        # Reports when collected and doesn't wait for the lost reply
+        del generator
+        gc.collect()
+        assert commands == ["list_channels", "iter_epg"]
+        assert len(conn.list_channels()) == 10
+
+def test_fetch_epg_parallel():
+    with FakeVDR(channels=8, events=40) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        for workers in (0, -1):
+            with pytest.raises(ValueError):
+                conn.fetch_epg_parallel(workers=workers)
+
+        del vdr.commands[:]
+        schedules = conn.fetch_epg_parallel(workers=3)
+        assert list(schedules.keys()) == list(conn.list_epg().keys())
+        assert vdr.commands.count("QUIT") == 3
+
+def test_pute_transactions():
+    schedules = make_schedules([2, 2, 0], 3)
+    transactions = list(_pute_transactions(schedules, 2))
+    assert len(transactions) == 2
+    for lines in transactions:
+        # One complete block per transaction, no empty ones
+        assert [line[0] for line in lines].count("C") == 1
+        assert lines[0].startswith("C ") and lines[-1] == "c"
+        assert sum(line[0] == "E" for line in lines) == 2
+
+    transactions = list(_pute_transactions(schedules, 3))
+    assert [sum(line[0] == "E" for line in lines) for lines in transactions] == [3, 1]
+    assert [line for line in transactions[1] if line[0] in "Cc"] == ["C S19.2E-1-1000-28001 Channel 1", "c"]
+
+def test_put_epg_maxevents():
+    schedules = make_schedules(5000)
+    with FakeVDR(channels=2, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        conn.put_epg(schedules, maxevents=3000)
+        assert vdr.commands.count("PUTE") == 4
+        assert str(conn.list_epg()) == str(schedules)
+
+def test_put_epg_failed_transaction():
+    schedules = make_schedules(4, 3)
+    schedules["invalid"] = schedules.pop("S19.2E-1-1000-28001")
+    schedules["S19.2E-1-1000-28002"] = schedules.pop("S19.2E-1-1000-28002")
+    with FakeVDR(channels=3, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        with pytest.raises(ActionAborted):
+            conn.put_epg(schedules, maxevents=2)
+        # The other transactions were sent anyway
+        assert vdr.commands.count("PUTE") == 6
+        received = conn.list_epg()
+        assert list(received.keys()) == ["S19.2E-1-1000-28000", "S19.2E-1-1000-28002"]
+        assert len(received["S19.2E-1-1000-28002"]) == 4
+
+def test_schedule_lookups():
+    schedule = make_schedules(4, channels=1)["S19.2E-1-1000-28000"]
+    schedule[2].duration = 600      # Gap from +4200 to +5400
+    schedule.reindex()
+    start = SYNTHETIC_START
+
+    assert schedule.at(start - 1) is None
+    assert schedule.at(start + 1800).eventid == 2
+    assert schedule.at(start + 1799).eventid == 1
+    assert schedule.at(start + 4500) is None
+    assert [event.eventid for event in schedule.between(start + 1000, start + 3700)] == [1, 2, 3]
+
+    # Like VDR's GetPresentEvent the last started event is present, even
+    # in a gap
+    assert schedule.now(start - 1) is None
+    assert schedule.next(start - 1) is None
+    assert schedule.now(start + 1800).eventid == 2
+    assert schedule.now(start + 4500).eventid == 3
+    assert schedule.next(start + 4500).eventid == 4
+    assert schedule.now(start + 9000).eventid == 4
+    assert schedule.next(start + 9000) is None
+
+def test_now_next_like_lste():
+    now = int(time.time())
+    channelid = "S19.2E-1-1000-28000"
+    lines = ["C {} Channel".format(channelid),
+             "E 1 {} 600 4E 1".format(now - 3600), "T Ended", "e",
+             "E 2 {} 600 4E 1".format(now + 1800), "T Later", "e",
+             "E 3 {} 600 4E 1".format(now + 3600), "T Latest", "e",
+             "c"]
+    with FakeVDR(channellines=["1 Channel;Provider:11494:h:S19.2E:22000:0:0:0:0:28000:1:1000:0"],
+                 epglines=lines) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        schedule = conn.list_epg()[channelid]
+        present = conn.list_epg(filter="now")[channelid]
+        following = conn.list_epg(filter="next")[channelid]
+
+    assert [event.eventid for event in present] == [schedule.now().eventid] == [1]
+    assert [event.eventid for event in following] == [schedule.next().eventid] == [2]
+    assert schedule.at(now) is None
+
+def test_serialization():
+    with FakeVDR(channels=3, events=9) as vdr:
+        schedules = SVDRPConnection(vdr.host, vdr.port).list_epg()
+        expected = synthetic_epg(list(schedules), 9)
+
+    assert list(schedules.iter_lines()) == expected
+    assert str(schedules) == "".join(line + "\n" for line in expected)
+    fp = io.StringIO()
+    schedules.write_to(fp)
+    assert fp.getvalue() == str(schedules)
+
+    # Schedules and events give their part of the lines
+    schedule = next(iter(schedules.values()))
+    assert list(schedule.iter_lines()) == expected[1:expected.index("c")]
+    assert list(schedule[0].iter_lines()) == expected[2:expected.index("e")]
+    assert schedule[0].description == "Live-Übertragung vom Fußball\nwith a second line"
+
+def test_lazy_events():
+    with FakeVDR(channels=3, events=9) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        schedules = conn.list_epg()
+        lazy = conn.list_epg(lazy=True)
+
+    event = next(iter(lazy.values()))[1]
+    assert isinstance(event, LazyEvent)
+
+    # Fields are decoded on first access
+    with pytest.raises(AttributeError):
+        Event.title.__get__(event, LazyEvent)
+    assert event.title == "Title of event 1"
+    assert Event.title.__get__(event, LazyEvent) == "Title of event 1"
+    assert event.description == "Live-Übertragung vom Fußball\nwith a second line"
+    assert event.contents == ["12", "20"]
+    assert event.components == ["2 03 deu stereo"]
+    assert event.parentalrating is None
+    assert event.aux is None
+    assert str(lazy) == str(schedules)
+
+    event.title = "Changed"
+    event.parentalrating = "16"
+    assert event.title == "Changed"
+    assert "T Changed" in list(event.iter_lines())
+    assert "R 16" in list(event.iter_lines())
+
+    with pytest.raises(ValueError):
+        LazyEvent().read(iter(["T Title", "Q Unknown", "e"]))
+
+def test_objects_without_dict():
+    with FakeVDR(channels=2, events=4) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        channel = conn.list_channels()[0]
+        event = conn.list_epg()[channel.channelid][0]
+
+    for item in (channel, event, LazyEvent()):
+        assert not hasattr(item, "__dict__")
+        with pytest.raises(AttributeError):
+            item.misspelled = 1
+
+    # Copies keep all fields
+    copied = pickle.loads(pickle.dumps([channel, event]))
+    assert str(copied[0]) == str(channel)
+    assert list(copied[1].iter_lines()) == list(event.iter_lines())
+    assert copied[1].eventid == event.eventid
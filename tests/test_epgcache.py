@@ -0,0 +1,100 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp import SVDRPConnection, epg
+from pysvdrp.epgcache import EPGCache
+from pysvdrp.fakevdr import FakeVDR, SYNTHETIC_START
+
+CHANNEL = "S19.2E-1-1000-28000"
+
+
+def pute(conn, *events):
+    lines = ["C {} Channel 0".format(CHANNEL)]
+    for eventid, version, title in events:
+        lines += ["E {} {} 1800 4E {:X}".format(eventid, SYNTHETIC_START + (eventid - 1) * 1800, version),
+                  "T " + title, "e"]
+    lines.append("c")
+    conn.put_epg("\n".join(lines))
+
+def changes(delta):
+    return ([(channelid, event.eventid) for channelid, event in delta.added],
+            [(channelid, event.eventid) for channelid, event in delta.changed],
+            [(channelid, event.eventid) for channelid, event in delta.removed])
+
+def test_refresh_deltas():
+    with FakeVDR(channels=3, events=6) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        cache = EPGCache(conn)
+        delta = cache.refresh()
+        assert len(delta.added) == 6 and not delta.changed and not delta.removed
+        assert not cache.refresh()
+        unchanged = cache.schedules[CHANNEL][0]
+
+        pute(conn, (2, 5, "New version"), (10, 0, "Added"))
+        with vdr._lock:
+            del vdr.schedules["S19.2E-1-1000-28002"][1][1]
+            vdr._replycache.clear()
+        delta = cache.refresh()
+        assert changes(delta) == ([(CHANNEL, 10)], [(CHANNEL, 2)], [("S19.2E-1-1000-28002", 1)])
+        assert delta.changed[0][1].title == "New version"
+        assert [event.eventid for event in cache.schedules[CHANNEL]] == [1, 2, 10]
+        assert cache.schedules[CHANNEL][0] is unchanged
+        assert not cache.refresh()
+
+        conn.clear_epg("S19.2E-1-1000-28001")
+        delta = cache.refresh()
+        assert changes(delta) == ([], [], [("S19.2E-1-1000-28001", 1), ("S19.2E-1-1000-28001", 2)])
+        assert "S19.2E-1-1000-28001" not in cache.schedules
+
+def test_refresh_does_not_parse_known_events(monkeypatch):
+    with FakeVDR(channels=2, events=10) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        cache = EPGCache(conn)
+        cache.refresh()
+        pute(conn, (3, 7, "Changed"))
+
+        parsed = []
+        read_event = epg._read_event
+        def counting(line, iterator):
+            parsed.append(line)
+            return read_event(line, iterator)
+        monkeypatch.setattr(epg, "_read_event", counting)
+        delta = cache.refresh()
+        assert changes(delta) == ([], [(CHANNEL, 3)], [])
+        assert len(parsed) == 1
+
+def test_refresh_with_filter():
+    with FakeVDR(channels=1, events=3) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        cache = EPGCache(conn)
+        cache.refresh()
+        pute(conn, (2, 2, "Changed"))
+        delta = cache.refresh(filter="at {}".format(SYNTHETIC_START + 1800 + 60))
+        assert changes(delta) == ([], [(CHANNEL, 2)], [])
+        assert [event.title for event in cache.schedules[CHANNEL]] == \
+               ["Title of event 0", "Changed", "Title of event 2"]
+
+def test_refresh_after_load(tmp_path):
+    with FakeVDR(channels=2, events=4) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        cache = EPGCache(conn)
+        cache.refresh()
+        cache.save(str(tmp_path / "epg.snapshot"))
+
+        pute(conn, (1, 9, "Changed"))
+        loaded = EPGCache(conn)
+        loaded.load(str(tmp_path / "epg.snapshot"))
+        assert changes(loaded.refresh()) == ([], [(CHANNEL, 1)], [])
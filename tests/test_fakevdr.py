@@ -0,0 +1,74 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+import pytest
+from pysvdrp import SVDRPConnection
+from pysvdrp.exceptions import ParameterError
+from pysvdrp.fakevdr import FakeVDR, synthetic_channels
+
+
+def numbered(conn):
+    return [(channel.number, channel.name) for channel in conn.list_channels(True) if not channel.groupsep]
+
+def test_numbering_with_group_start():
+    lines = synthetic_channels(3)
+    lines = ["0 :Group", "0 " + lines[0], "0 :@10 Ten", "0 " + lines[1], "0 :@5 Five", "0 " + lines[2]]
+    with FakeVDR(channellines=lines, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        assert numbered(conn) == [(1, "Channel 0"), (10, "Channel 1"), (11, "Channel 2")]
+
+def test_movc():
+    with FakeVDR(channels=5, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        # Downwards the channel lands behind the target, upwards in front
+        conn.move_channel(1, 3)
+        assert [name for number, name in numbered(conn)] == \
+               ["Channel 1", "Channel 2", "Channel 0", "Channel 3", "Channel 4"]
+        conn.move_channel(5, 2)
+        assert [name for number, name in numbered(conn)] == \
+               ["Channel 1", "Channel 4", "Channel 2", "Channel 0", "Channel 3"]
+        with pytest.raises(ParameterError):
+            conn.move_channel(2, 2)
+        with pytest.raises(ParameterError):
+            conn.move_channel(1, 6)
+
+def test_movc_to_group_start():
+    lines = ["0 " + line for line in synthetic_channels(4)]
+    lines.insert(2, "0 :@10 Ten")
+    with FakeVDR(channellines=lines, events=0) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        # The moved channel gets the number of the target, so it has to be
+        # placed behind the group separator
+        conn.move_channel(1, 10)
+        assert numbered(conn) == [(1, "Channel 1"), (10, "Channel 0"), (11, "Channel 2"), (12, "Channel 3")]
+
+def test_fakevdr_serves_clients_in_parallel():
+    with FakeVDR(channels=10, events=0, latency=0.3) as vdr:
+        def client():
+            conn = SVDRPConnection(vdr.host, vdr.port)
+            conn.list_channels()
+            conn.close()
+
+        threads = [threading.Thread(target=client) for index in range(4)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Greeting and LSTC reply are delayed. Serialized this takes 2.4s.
+        assert time.perf_counter() - start < 1.5
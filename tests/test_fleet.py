@@ -0,0 +1,52 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp.fakevdr import FakeVDR, synthetic_channels, synthetic_epg
+from pysvdrp.fleet import VDRFleet
+
+
+def test_fleet_keeps_host_channel_numbers():
+    lines = synthetic_channels(5)
+    first = ["{} {}".format(index + 1, line) for index, line in enumerate(lines)]
+    second = ["{} {}".format(index + 1, line) for index, line in enumerate(reversed(lines))]
+    with FakeVDR(channellines=first, events=0) as vdr1, \
+         FakeVDR(channellines=second, events=0) as vdr2:
+        result = VDRFleet([(vdr1.host, vdr1.port), (vdr2.host, vdr2.port)]).list_channels()
+        channels = result.results[(vdr2.host, vdr2.port)]
+        assert [channel.number for channel in channels] == [1, 2, 3, 4, 5]
+        assert [channel.name for channel in channels] == \
+               ["Channel 4", "Channel 3", "Channel 2", "Channel 1", "Channel 0"]
+        assert len(result.merged) == 5
+
+def test_fleet_merges_epg():
+    channelids = ["S19.2E-1-1000-28000", "S19.2E-1-1000-28001"]
+    first = synthetic_epg(channelids, 6)
+    # The second host (which answers later) knows the second event in a
+    # newer version which starts later than the third one
+    second = ["C S19.2E-1-1000-28000 Channel 0",
+              "E 2 1609099999 1800 4E 2", "T Moved", "e",
+              "c"]
+    with FakeVDR(channels=2, epglines=first) as vdr1, \
+         FakeVDR(channels=2, epglines=second, latency=0.3) as vdr2:
+        hosts = [(vdr1.host, vdr1.port), (vdr2.host, vdr2.port)]
+        result = VDRFleet(hosts).list_epg()
+        assert not result.errors
+        schedule = result.merged["S19.2E-1-1000-28000"]
+        assert [event.eventid for event in schedule] == [1, 3, 2]
+        assert schedule[2].title == "Moved"
+        assert [event.starttime for event in schedule] == sorted(event.starttime for event in schedule)
+        assert len(result.merged["S19.2E-1-1000-28001"]) == 3
+        assert result.results[hosts[1]] == ["S19.2E-1-1000-28000"]
@@ -0,0 +1,48 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import subprocess
+import sys
+
+
+# Runs "code" in a fresh interpreter and returns the modules it printed
+def loaded_modules(code):
+    code += "\nimport sys\nprint(' '.join(sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], check=True,
+                            capture_output=True, text=True).stdout
+    return set(output.split())
+
+def test_import_is_lazy():
+    modules = loaded_modules("import pysvdrp")
+    assert "pysvdrp.exceptions" in modules
+    for module in ("pysvdrp.channels", "pysvdrp.epg", "pysvdrp.aio",
+                   "pysvdrp.metrics", "cchardet", "asyncio"):
+        assert module not in modules
+
+def test_command_modules_loaded_on_use():
+    modules = loaded_modules(
+        "from pysvdrp.fakevdr import FakeVDR\n"
+        "from pysvdrp import SVDRPConnection\n"
+        "with FakeVDR(channels=3, events=30) as vdr:\n"
+        "    conn = SVDRPConnection(vdr.host, vdr.port)\n"
+        "    conn.list_plugins()\n"
+        "    conn.list_epg()\n"
+        "    assert SVDRPConnection.list_plugins.__module__ == 'pysvdrp.plugins'\n")
+    assert "pysvdrp.plugins" in modules
+    assert "pysvdrp.epg" in modules
+    # Clean replies don't need a charset detection
+    assert "cchardet" not in modules
+    assert "pysvdrp.columnar" not in modules
@@ -0,0 +1,62 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp import SVDRPConnection
+from pysvdrp.fakevdr import FakeVDR
+from pysvdrp.metrics import MetricsCollector
+
+
+def test_collector():
+    with FakeVDR(channels=10, events=20, latency=0.05) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        collector = MetricsCollector()
+        conn.observers.append(collector)
+        conn.list_channels()
+        conn.list_channels()
+        for channelid, schedule in conn.iter_epg():
+            pass
+        stats = collector.snapshot()
+
+    assert set(stats) == {"list_channels", "iter_epg"}
+    channels = stats["list_channels"]
+    assert channels["count"] == 2
+    assert channels["lines"] == 20
+    assert channels["bytes"] > 0
+    assert channels["firstreply"] >= 0.1
+    assert channels["recvtime"] >= channels["firstreply"]
+
+    # 10 channels with 2 events of 8 lines, "C" and "c" lines and the end line
+    assert stats["iter_epg"]["count"] == 1
+    assert stats["iter_epg"]["lines"] == 10 * (2 * 8 + 2) + 1
+
+    collector.reset()
+    assert collector.snapshot() == {}
+
+def test_nested_commands():
+    with FakeVDR(channels=10, events=20) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        metrics = []
+        conn.observers.append(metrics.append)
+        # Uses "iter_epg" internally
+        conn.list_epg()
+        assert [item.command for item in metrics] == ["list_epg"]
+        assert metrics[0].lines == 10 * (2 * 8 + 2) + 1
+
+        # Without observers nothing is measured
+        conn.observers.clear()
+        conn.list_channels()
+        assert conn._metrics is None
+        assert len(metrics) == 1
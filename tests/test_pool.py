@@ -0,0 +1,85 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+import pytest
+from pysvdrp.exceptions import SVDRPException
+from pysvdrp.fakevdr import FakeVDR
+from pysvdrp.pool import SVDRPPool
+
+
+def test_reuses_connections():
+    with FakeVDR(channels=5, events=10) as vdr:
+        pool = SVDRPPool()
+        with pool.connection(vdr.host, vdr.port) as conn:
+            conn.list_channels()
+            sock = conn.socket
+        with pool.connection(vdr.host, vdr.port) as again:
+            assert again is conn
+            again.list_channels()
+            assert again.socket is sock
+
+        # Error replies don't break the connection
+        with pytest.raises(SVDRPException):
+            with pool.connection(vdr.host, vdr.port) as again:
+                again.move_channel(99, 1)
+        with pool.connection(vdr.host, vdr.port) as again:
+            assert again is conn
+        pool.close()
+
+def test_close_disconnects_idle():
+    with FakeVDR(channels=5, events=10) as vdr:
+        pool = SVDRPPool()
+        with pool.connection(vdr.host, vdr.port) as conn:
+            conn.list_channels()
+        pool.close()
+        assert conn.socket is None
+
+        with pool.connection(vdr.host, vdr.port) as again:
+            assert again is not conn
+
+def test_connection_closed_by_vdr():
+    with FakeVDR(channels=5, events=10, idletimeout=0.2) as vdr:
+        pool = SVDRPPool()
+        with pool.connection(vdr.host, vdr.port) as conn:
+            conn.list_channels()
+        time.sleep(0.5)
+        with pool.connection(vdr.host, vdr.port) as again:
+            assert again is conn
+            assert len(again.list_channels()) == 5
+        pool.close()
+
+def test_maxsize_timeout():
+    with FakeVDR(channels=5, events=10) as vdr:
+        pool = SVDRPPool(maxsize=1, timeout=0.2)
+        borrowed = threading.Event()
+        done = threading.Event()
+        def borrower():
+            with pool.connection(vdr.host, vdr.port):
+                borrowed.set()
+                done.wait(5)
+        thread = threading.Thread(target=borrower)
+        thread.start()
+        borrowed.wait(5)
+        try:
+            with pytest.raises(TimeoutError):
+                with pool.connection(vdr.host, vdr.port):
+                    pass
+        finally:
+            done.set()
+            thread.join()
+        pool.close()
@@ -0,0 +1,90 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp import SVDRPConnection
+from pysvdrp.epg import Event
+from pysvdrp.fakevdr import FakeVDR
+from pysvdrp.search import SearchIndex
+
+
+def make_event(eventid, title, shorttext = None, description = None, contents = None):
+    event = Event()
+    event.eventid = eventid
+    event.starttime = 1609085723 + eventid * 1800
+    event.title = title
+    event.shorttext = shorttext
+    event.description = description
+    event.contents = contents
+    return event
+
+def eventids(results):
+    return [event.eventid for channelid, event in results]
+
+def test_ranking():
+    index = SearchIndex()
+    index.add("A", make_event(1, "News", description="Tatort preview"))
+    index.add("A", make_event(2, "Tatort"))
+    index.add("B", make_event(3, "Crime", shorttext="Tatort"))
+    index.add("B", make_event(4, "Tatortreiniger"))
+    assert len(index) == 4
+
+    # Title beats short text beats description. Prefix matches count half,
+    # so the prefix match in the title of event 4 ranks like the short text
+    # of event 3. Equal ranks are ordered by start time.
+    assert eventids(index.search("tatort")) == [2, 3, 4, 1]
+    assert eventids(index.search("TATORT", limit=2)) == [2, 3]
+    assert eventids(index.search("tatort preview")) == [1]
+    assert index.search("tatort missing") == []
+    assert index.search("") == []
+
+def test_filters():
+    index = SearchIndex()
+    index.add("A", make_event(1, "Fußball live", contents=["43"]))
+    index.add("B", make_event(2, "Fußball Bundesliga", contents=["40", "12"]))
+    index.add("B", make_event(3, "Fußballgeschichte", contents=["21"]))
+
+    assert eventids(index.search("fußball", channelids="B")) == [2, 3]
+    assert eventids(index.search("fußball", channelids=["A", "C"])) == [1]
+    assert eventids(index.search("fußball", contents="4")) == [1, 2]
+    assert eventids(index.search("fußball", contents=["12", "21"])) == [2, 3]
+
+def test_remove():
+    index = SearchIndex()
+    event = make_event(1, "Tatort")
+    index.add("A", event)
+    index.add("A", make_event(2, "Tatortreiniger"))
+    index.remove(event)
+    index.remove(event)
+    assert eventids(index.search("tatort")) == [2]
+
+    # Events modified in place are added again
+    event.title = "Polizeiruf"
+    index.add("A", event)
+    index.add("A", event)
+    assert eventids(index.search("polizei")) == [1]
+    assert len(index) == 2
+    index.clear()
+    assert index.search("polizei") == []
+
+def test_filled_while_receiving():
+    with FakeVDR(channels=3, events=30) as vdr:
+        index = SearchIndex()
+        schedules = SVDRPConnection(vdr.host, vdr.port).list_epg(index=index)
+    assert len(index) == 30
+    results = index.search("title event 3")
+    assert eventids(results) == [4, 4, 4]
+    assert [channelid for channelid, event in results] == list(schedules)
+    assert len(SearchIndex(schedules).search("fuß")) == 30
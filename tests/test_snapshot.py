@@ -0,0 +1,71 @@
+#    pysvdrp - Python SVDRP binding to control a running VDR instance
+#    Copyright (C) 2021  Manuel Reimer <manuel.reimer@gmx.de>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pysvdrp import SVDRPConnection
+from pysvdrp.epg import Schedules
+from pysvdrp.epgcache import EPGCache
+from pysvdrp.fakevdr import FakeVDR
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "epg.snapshot")
+    with FakeVDR(channels=3, events=15) as vdr:
+        schedules = SVDRPConnection(vdr.host, vdr.port).list_epg()
+    schedules.save(path)
+
+    loaded = Schedules.load(path)
+    assert list(loaded) == list(schedules)
+    assert [len(schedule) for schedule in loaded.values()] == [5, 5, 5]
+    assert str(loaded) == str(schedules)
+
+def test_map_closed_after_last_schedule(tmp_path):
+    path = str(tmp_path / "epg.snapshot")
+    with FakeVDR(channels=2, events=6) as vdr:
+        SVDRPConnection(vdr.host, vdr.port).list_epg().save(path)
+
+    loaded = Schedules.load(path)
+    first, second = loaded.values()
+    snapshot = first._snapshot
+    assert not snapshot._map.closed
+
+    first[0]
+    assert not snapshot._map.closed
+    second[0]
+    assert snapshot._map.closed
+
+def test_cache_load_then_save(tmp_path):
+    path = str(tmp_path / "epg.snapshot")
+    with FakeVDR(channels=3, events=12) as vdr:
+        conn = SVDRPConnection(vdr.host, vdr.port)
+        cache = EPGCache(conn)
+        cache.refresh()
+        cache.save(path)
+        expected = str(cache.schedules)
+
+        cache = EPGCache(conn)
+        cache.load(path)
+        snapshot = next(iter(cache.schedules.values()))._snapshot
+
+        # Saving to the mapped file has to close the map first. Pending
+        # schedules still get their events.
+        del cache.schedules[next(iter(cache.schedules))]
+        cache.save(path)
+        assert snapshot._map.closed
+
+        cache = EPGCache(conn)
+        cache.load(path)
+        assert len(cache.schedules) == 2
+        assert str(cache.schedules) in expected